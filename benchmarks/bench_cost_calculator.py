@@ -0,0 +1,105 @@
+"""
+Scaling benchmark of CostCalculator on synthetic fabrication data.
+
+Every size runs in a fresh worker process, so the peak memory reported for
+one size is not inflated by the previous ones. Timings come from the progress
+records emitted by CostCalculator.
+
+Usage
+-----
+    python benchmarks/bench_cost_calculator.py
+    python benchmarks/bench_cost_calculator.py --sizes 10000 100000 --solver sparse --output bench.csv
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from calculadora_costes.services.cost_calculator import CostCalculator  # noqa: E402
+from synthetic_bom import generate_fabricaciones  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def run_case(n_rows: int, solver: str, generator_options: dict) -> dict:
+    """
+    Generates `n_rows` rows, costs them and returns the timings of every stage.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows to generate.
+    solver : str
+        Solver passed to `calculate_costs_recursively`.
+    generator_options : dict
+        Keyword arguments of `generate_fabricaciones`.
+
+    Returns
+    -------
+    dict
+        Row count, lots, levels, seconds per stage and peak memory in MB.
+    """
+    start = time.perf_counter()
+    fabricaciones = generate_fabricaciones(n_rows, **generator_options)
+    generation = time.perf_counter() - start
+
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively(solver=solver)
+    calculator.generate_manufacturing_costs()
+
+    events = calculator.get_events().set_index('etapa')
+    return {
+        'registros': len(fabricaciones),
+        'lotes': int(events.loc['construccion', 'lotes']),
+        'niveles': int(events.loc['construccion', 'niveles']),
+        'generacion_s': generation,
+        'construccion_s': events.loc['construccion', 'segundos'],
+        'calculo_s': events.loc['calculo', 'segundos'],
+        'costes_fabricacion_s': events.loc['costes_fabricacion', 'segundos'],
+        'memoria_pico_mb': events['memoria_pico_mb'].max()
+    }
+
+
+def main() -> None:
+    """
+    Parses the command line, runs every size and prints the results table.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark de CostCalculator con datos sintéticos")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Número de registros de cada caso")
+    parser.add_argument('--solver', choices=['levels', 'sparse'], default='levels')
+    parser.add_argument('--depth', type=int, default=4, help="Niveles de fabricación")
+    parser.add_argument('--fan-out', type=int, default=8, help="Componentes por lote")
+    parser.add_argument('--lots-per-article', type=int, default=20, help="Lotes por artículo")
+    parser.add_argument('--shared-sem-ratio', type=float, default=0.15, help="Proporción de componentes semielaborados")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Fichero CSV donde guardar los resultados")
+    args = parser.parse_args()
+
+    generator_options = {
+        'depth': args.depth,
+        'fan_out': args.fan_out,
+        'lots_per_article': args.lots_per_article,
+        'shared_sem_ratio': args.shared_sem_ratio,
+        'seed': args.seed
+    }
+
+    results = []
+    for n_rows in args.sizes:
+        print(f"Ejecutando {n_rows} registros...", flush=True)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(run_case, n_rows, args.solver, generator_options).result())
+
+    results = pd.DataFrame(results)
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    if args.output:
+        results.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
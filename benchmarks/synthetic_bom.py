@@ -0,0 +1,113 @@
+"""
+Synthetic fabrication data for benchmarking CostCalculator.
+
+Generates frames with the columns of `Parameters.fabricaciones` for a BOM of
+configurable depth and size. Every label is drawn from a small vocabulary, so
+even 10M rows only hold references to a few thousand strings.
+"""
+import numpy as np
+import pandas as pd
+
+
+def generate_fabricaciones(n_rows: int,
+                           depth: int = 4,
+                           fan_out: int = 8,
+                           lots_per_article: int = 20,
+                           shared_sem_ratio: float = 0.15,
+                           n_purchased: int = 500,
+                           seed: int = 0) -> pd.DataFrame:
+    """
+    Generates a fabrications frame with a random multi-level BOM.
+
+    Product lots are spread evenly over `depth` levels. Level 1 products only
+    consume purchased components; products of higher levels also consume lots
+    of semi-finished articles of the level just below, which are shared by
+    many parents.
+
+    Parameters
+    ----------
+    n_rows : int
+        Approximate number of rows (one row per component of a product lot).
+    depth : int, default 4
+        Number of manufactured BOM levels.
+    fan_out : int, default 8
+        Components per product lot.
+    lots_per_article : int, default 20
+        Lots manufactured of each article.
+    shared_sem_ratio : float, default 0.15
+        Share of the component rows above level 1 that consume a semi-finished lot.
+    n_purchased : int, default 500
+        Number of distinct purchased components.
+    seed : int, default 0
+        Seed of the random generator.
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame with the columns id_orden, fecha_fabricacion, articulo,
+        lote_articulo, unidades_fabricadas, componente, lote_componente,
+        coste_componente_unitario, consumo_unitario and consumo_total.
+        Semi-finished rows have no cost.
+    """
+    rng = np.random.default_rng(seed)
+    n_product_lots = max(depth, -(-n_rows // fan_out))
+
+    # Product lots by level (lots are numbered in level order), grouped into
+    # articles of `lots_per_article` lots that never straddle two levels
+    lot_levels = np.repeat(np.arange(1, depth + 1), -(-n_product_lots // depth))[:n_product_lots]
+    lot_numbers = np.arange(n_product_lots)
+    level_start = np.searchsorted(lot_levels, np.arange(1, depth + 2))
+    within_level = lot_numbers - level_start[lot_levels - 1]
+    articles_per_level = -(-np.diff(level_start) // lots_per_article)
+    article_offset = np.concatenate([[0], np.cumsum(articles_per_level)])
+    lot_articles = article_offset[lot_levels - 1] + within_level // lots_per_article
+    lot_indexes = within_level % lots_per_article
+
+    article_levels = np.repeat(np.arange(1, depth + 1), articles_per_level)
+    article_labels = np.array(
+        [f"{'FCAR' if level == depth else 'SEM'}{article:03d}" for article, level in enumerate(article_levels)],
+        dtype=object
+    )
+    lot_labels = np.array([f"{lot:06d}" for lot in range(lots_per_article)], dtype=object)
+    order_labels = np.array([f"OF-{lot}" for lot in lot_numbers], dtype=object)
+
+    # One row per component of every product lot
+    parents = np.repeat(lot_numbers, fan_out)
+    parent_levels = lot_levels[parents]
+    is_sem = (parent_levels > 1) & (rng.random(len(parents)) < shared_sem_ratio)
+
+    # Semi-finished rows consume a random lot of the level below
+    below_start = level_start[np.maximum(parent_levels - 2, 0)]
+    below_size = level_start[np.maximum(parent_levels - 1, 0)] - below_start
+    children = below_start + (rng.random(len(parents)) * below_size).astype(np.int64)
+
+    purchased_prefixes = np.array(['MAT', 'MAUX', 'VAR'], dtype=object)
+    purchased_labels = np.array(
+        [f"{purchased_prefixes[i % 3]}{i:03d}" for i in range(n_purchased)], dtype=object
+    )
+    purchased_lot_labels = np.array(
+        [f"{2300 + month % 12 + 1 + 100 * (month // 12):04d}-{number:03d}"
+         for month in range(24) for number in range(1, 51)],
+        dtype=object
+    )
+    purchased = rng.integers(0, n_purchased, len(parents))
+    purchased_lots = rng.integers(0, len(purchased_lot_labels), len(parents))
+    prices = np.round(rng.lognormal(mean=0.0, sigma=1.0, size=n_purchased), 4)
+
+    units = np.round(rng.uniform(50, 500, n_product_lots), 2)
+    consumo = np.round(rng.uniform(0.01, 2.0, len(parents)), 4)
+    # Lower levels are manufactured first
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 365, n_product_lots)), unit='D')
+
+    return pd.DataFrame({
+        'id_orden': order_labels[parents],
+        'fecha_fabricacion': dates[parents],
+        'articulo': article_labels[lot_articles[parents]],
+        'lote_articulo': lot_labels[lot_indexes[parents]],
+        'unidades_fabricadas': units[parents],
+        'componente': np.where(is_sem, article_labels[lot_articles[children]], purchased_labels[purchased]),
+        'lote_componente': np.where(is_sem, lot_labels[lot_indexes[children]], purchased_lot_labels[purchased_lots]),
+        'coste_componente_unitario': np.where(is_sem, np.nan, prices[purchased]),
+        'consumo_unitario': consumo,
+        'consumo_total': np.round(consumo * units[parents], 2)
+    })
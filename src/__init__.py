@@ -1,6 +1,6 @@
 from .cleaning import DataFrameCleaner
 from .config import Parameters
-from .services import Encoder, Validator, OutliersManager, CostCalculator, VisualizationManager
+from .services import Encoder, Validator, OutliersManager, CostCalculator, CostLookup, InventoryCosting, PriceIndex, VisualizationManager
 
 __all__ = [
     'Encoder',
@@ -9,5 +9,8 @@ __all__ = [
     'Validator',
     'OutliersManager',
     'CostCalculator',
+    'CostLookup',
+    'InventoryCosting',
+    'PriceIndex',
     'VisualizationManager'
 ]
@@ -94,6 +94,31 @@ class Parameters:
     )
 
 
+    costes_historico = DatasetParams(
+        cols_to_keep=[
+            'Cód. artículo',
+            'PRCMONEDA',
+            'LOTEINTERNO',
+            'FECDOC',
+            'UNIDADES'
+        ],
+        rename_map={
+            'Cód. artículo': 'componente',
+            'PRCMONEDA': 'coste_componente_unitario',
+            'LOTEINTERNO': 'lote_componente',
+            'FECDOC': 'fecha_precio',
+            'UNIDADES': 'unidades_compradas'
+        },
+        cols_to_float=['coste_componente_unitario', 'unidades_compradas'],
+        cols_to_date=['fecha_precio'],
+        validation_map={
+            'componente': r'^[A-Za-zÀ-ÖØ-öø-ÿ]+[0-9]{2,3}$',   # TEXT + 2-3 números
+            'lote_componente': r'^[0-9]{4}-[0-9]{3}$'   # 1234-567
+        },
+        drop_na_subset=['PRCMONEDA', 'FECDOC']   # keep every dated price: no duplicate removal, the history is the point
+    )
+
+
     fabricaciones = DatasetParams(
         cols_to_keep=[
             'Nº Orden',
@@ -103,6 +128,7 @@ class Parameters:
             'Unidades Fabricadas',
             'Componente',
             'lote_componente_x',
+            'Familia',
             'coste_componente_unitario',
             'Consumo Unitario',
             'Consumo Total'
@@ -115,6 +141,7 @@ class Parameters:
             'Unidades Fabricadas':'unidades_fabricadas',
             'Componente': 'componente',
             'lote_componente_x': 'lote_componente',
+            'Familia': 'familia',
             'coste_componente_unitario': 'coste_componente_unitario',
             'Consumo Unitario': 'consumo_unitario',
             'Consumo Total': 'consumo_total'
@@ -2,11 +2,17 @@ from .outliers_manager import OutliersManager
 from .validator import Validator
 from .encoder import Encoder
 from .cost_calculator import CostCalculator
+from .cost_lookup import CostLookup
+from .inventory_costing import InventoryCosting
+from .price_index import PriceIndex
 from .visualizations_manager import VisualizationManager
 __all__ = [
     'OutliersManager',
     'Validator',
     'Encoder',
     'CostCalculator',
+    'CostLookup',
+    'InventoryCosting',
+    'PriceIndex',
     'VisualizationManager'
 ]
\ No newline at end of file
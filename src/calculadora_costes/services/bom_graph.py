@@ -0,0 +1,506 @@
+import numpy as np
+from typing import Optional
+
+
+class BomGraph:
+    """
+    Dependency graph between manufactured items and the items they consume.
+
+    Nodes are integer codes and every edge goes from a product (parent) to a
+    component (child) that is itself manufactured. The graph is built once and
+    ordered topologically, so costs can be rolled up level by level in a single
+    pass: level 0 items only consume purchased components, level k items only
+    consume items of lower levels.
+    """
+
+    def __init__(self, parents: np.ndarray, children: np.ndarray, n_nodes: int):
+        """
+        Initializes the graph and computes the level of every node.
+
+        Parameters
+        ----------
+        parents : np.ndarray
+            Integer code of the product of each edge.
+        children : np.ndarray
+            Integer code of the manufactured component of each edge.
+        n_nodes : int
+            Total number of nodes. Codes must lie in [0, n_nodes).
+
+        Returns
+        -------
+        BomGraph
+            The initialized graph.
+        """
+        edges = np.unique(
+            np.column_stack([np.asarray(parents, dtype=np.int64),
+                             np.asarray(children, dtype=np.int64)]).reshape(-1, 2),
+            axis=0
+        )
+        self.n_nodes = n_nodes
+        self.parents = edges[:, 0]
+        self.children = edges[:, 1]
+
+        # Edges sorted by child: CSR index child -> parents that consume it
+        order = np.argsort(self.children, kind='stable')
+        self._parents_by_child = self.parents[order]
+        self._child_indptr = self.indptr(self.children, n_nodes)
+
+        # Edges are sorted by parent after np.unique: CSR index parent -> children
+        self._parent_indptr = self.indptr(self.parents, n_nodes)
+
+        self.levels = self._compute_levels()
+
+    @staticmethod
+    def indptr(keys: np.ndarray, n_keys: int) -> np.ndarray:
+        """
+        Builds the CSR offsets of `keys` once they are sorted.
+
+        Parameters
+        ----------
+        keys : np.ndarray
+            Non-negative integer keys.
+        n_keys : int
+            Number of distinct possible keys.
+
+        Returns
+        -------
+        np.ndarray
+            Offsets of length n_keys + 1.
+        """
+        indptr = np.zeros(n_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=n_keys), out=indptr[1:])
+        return indptr
+
+    @staticmethod
+    def gather(indptr: np.ndarray, values: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """
+        Concatenates the CSR slices of several keys without a Python loop.
+
+        Parameters
+        ----------
+        indptr : np.ndarray
+            CSR offsets, one more than the number of keys.
+        values : np.ndarray
+            CSR values, sorted by key.
+        keys : np.ndarray
+            Keys whose slices are requested. Keys out of range yield nothing.
+
+        Returns
+        -------
+        np.ndarray
+            The concatenated values of all requested slices.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        keys = keys[(keys >= 0) & (keys < len(indptr) - 1)]
+        starts = indptr[keys]
+        lengths = indptr[keys + 1] - starts
+        total = lengths.sum()
+        if total == 0:
+            return values[:0]
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return values[offsets + np.arange(total)]
+
+    @staticmethod
+    def locate(indptr: np.ndarray, values: np.ndarray, keys: np.ndarray, query: np.ndarray,
+               side: str = 'left') -> np.ndarray:
+        """
+        Finds where each (key, value) pair falls inside CSR arrays whose slices are sorted.
+
+        Only the slices of the requested keys are read.
+
+        Parameters
+        ----------
+        indptr : np.ndarray
+            CSR offsets.
+        values : np.ndarray
+            Non-negative integer CSR values, sorted within each slice.
+        keys : np.ndarray
+            Key of each pair.
+        query : np.ndarray
+            Value of each pair.
+        side : str, default 'left'
+            As in `np.searchsorted`, within the slice of each key.
+
+        Returns
+        -------
+        np.ndarray
+            Position in `values` of each pair, or where it would be inserted
+            to keep its slice sorted.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        query = np.asarray(query, dtype=np.int64)
+        if not len(keys):
+            return keys
+        slice_keys = np.unique(keys)
+        starts = indptr[slice_keys]
+        lengths = indptr[slice_keys + 1] - starts
+        region = BomGraph.gather(indptr, values, slice_keys).astype(np.int64)
+
+        # Slices are read in key order and sorted inside, so (slice, value) is sorted
+        stride = max(int(region.max()) if len(region) else 0, int(query.max())) + 1
+        slots = np.searchsorted(slice_keys, keys)
+        found = np.searchsorted(
+            np.repeat(np.arange(len(slice_keys)), lengths) * stride + region,
+            slots * stride + query,
+            side=side
+        )
+        region_starts = np.cumsum(lengths) - lengths
+        return starts[slots] + found - region_starts[slots]
+
+    @staticmethod
+    def insert(indptr: np.ndarray, values: np.ndarray, keys: np.ndarray, new_values: np.ndarray,
+               n_keys: Optional[int] = None) -> tuple:
+        """
+        Inserts (key, value) pairs into CSR arrays, keeping every slice sorted.
+
+        Parameters
+        ----------
+        indptr : np.ndarray
+            CSR offsets.
+        values : np.ndarray
+            CSR values, sorted within each slice.
+        keys : np.ndarray
+            Key of each new pair.
+        new_values : np.ndarray
+            Value of each new pair.
+        n_keys : int, optional
+            Number of keys after the insertion, by default the current one.
+
+        Returns
+        -------
+        tuple
+            (indptr, values) with the new pairs.
+        """
+        n_keys = len(indptr) - 1 if n_keys is None else n_keys
+        indptr = np.concatenate([indptr, np.full(n_keys + 1 - len(indptr), indptr[-1])])
+        keys = np.asarray(keys, dtype=np.int64)
+        order = np.lexsort((new_values, keys))
+        keys, new_values = keys[order], np.asarray(new_values)[order]
+
+        positions = BomGraph.locate(indptr, values, keys, new_values, side='right')
+        counts = np.zeros(n_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=n_keys), out=counts[1:])
+        return indptr + counts, np.insert(values, positions, new_values)
+
+    @staticmethod
+    def remove(indptr: np.ndarray, values: np.ndarray, keys: np.ndarray, old_values: np.ndarray) -> tuple:
+        """
+        Removes (key, value) pairs from CSR arrays whose slices are sorted; missing pairs are ignored.
+
+        Parameters
+        ----------
+        indptr : np.ndarray
+            CSR offsets.
+        values : np.ndarray
+            CSR values, sorted within each slice and unique per key.
+        keys : np.ndarray
+            Key of each pair to remove.
+        old_values : np.ndarray
+            Value of each pair to remove.
+
+        Returns
+        -------
+        tuple
+            (indptr, values) without those pairs.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        positions = BomGraph.locate(indptr, values, keys, old_values)
+        inside = positions < indptr[keys + 1]
+        found = inside.copy()
+        found[inside] = values[positions[inside]] == np.asarray(old_values)[inside]
+        positions = np.unique(positions[found])
+
+        removed = np.zeros(len(indptr), dtype=np.int64)
+        np.cumsum(
+            np.bincount(np.searchsorted(indptr, positions, side='right') - 1, minlength=len(indptr) - 1),
+            out=removed[1:]
+        )
+        return indptr - removed, np.delete(values, positions)
+
+    def _compute_levels(self) -> np.ndarray:
+        """
+        Assigns BOM levels with Kahn's algorithm, one frontier at a time (private method).
+
+        Nodes that depend on a cycle never reach a zero pending count and keep level -1.
+        """
+        levels = np.full(self.n_nodes, -1, dtype=np.int64)
+        pending = np.bincount(self.parents, minlength=self.n_nodes)
+        frontier = np.flatnonzero(pending == 0)
+        level = 0
+        while frontier.size:
+            levels[frontier] = level
+            consumers = self.gather(self._child_indptr, self._parents_by_child, frontier)
+            pending -= np.bincount(consumers, minlength=self.n_nodes)
+            candidates = np.unique(consumers)
+            frontier = candidates[pending[candidates] == 0]
+            level += 1
+        return levels
+
+    def extend(self,
+               n_nodes: int,
+               parents: np.ndarray,
+               children: np.ndarray,
+               removed_parents: Optional[np.ndarray] = None,
+               removed_children: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Adds nodes and edges, removes edges and updates the levels they change.
+
+        The edge indexes are merged with the changes instead of rebuilt, and
+        only the new nodes, the parents of changed edges and their ancestors
+        get their level recomputed.
+
+        Parameters
+        ----------
+        n_nodes : int
+            Total number of nodes after the change; new nodes take the codes
+            from the current `n_nodes` on.
+        parents : np.ndarray
+            Integer code of the product of each new edge.
+        children : np.ndarray
+            Integer code of the manufactured component of each new edge.
+        removed_parents : np.ndarray, optional
+            Integer code of the product of each edge to remove.
+        removed_children : np.ndarray, optional
+            Integer code of the component of each edge to remove.
+
+        Returns
+        -------
+        np.ndarray
+            Codes of the nodes whose level was recomputed.
+        """
+        n_old = self.n_nodes
+        self.n_nodes = n_nodes
+        self.levels = np.concatenate([self.levels, np.full(n_nodes - n_old, -1, dtype=np.int64)])
+        self._parent_indptr = np.concatenate([self._parent_indptr, np.full(n_nodes - n_old, self._parent_indptr[-1])])
+        self._child_indptr = np.concatenate([self._child_indptr, np.full(n_nodes - n_old, self._child_indptr[-1])])
+
+        removed_parents = np.asarray([] if removed_parents is None else removed_parents, dtype=np.int64)
+        removed_children = np.asarray([] if removed_children is None else removed_children, dtype=np.int64)
+        self._parent_indptr, self.children = self.remove(
+            self._parent_indptr, self.children, removed_parents, removed_children
+        )
+        self._child_indptr, self._parents_by_child = self.remove(
+            self._child_indptr, self._parents_by_child, removed_children, removed_parents
+        )
+
+        # Edges not present yet, each once
+        edges = np.unique(np.column_stack([np.asarray(parents, dtype=np.int64),
+                                           np.asarray(children, dtype=np.int64)]).reshape(-1, 2), axis=0)
+        parents, children = edges[:, 0], edges[:, 1]
+        positions = self.locate(self._parent_indptr, self.children, parents, children)
+        inside = positions < self._parent_indptr[parents + 1]
+        present = inside.copy()
+        present[inside] = self.children[positions[inside]] == children[inside]
+        parents, children = parents[~present], children[~present]
+
+        self._parent_indptr, self.children = self.insert(self._parent_indptr, self.children, parents, children)
+        self._child_indptr, self._parents_by_child = self.insert(
+            self._child_indptr, self._parents_by_child, children, parents
+        )
+        self.parents = np.repeat(np.arange(n_nodes), np.diff(self._parent_indptr))
+
+        nodes = self.ancestors(np.concatenate([np.arange(n_old, n_nodes), parents, removed_parents]))
+        self._update_levels(nodes)
+        return nodes
+
+    def _update_levels(self, nodes: np.ndarray) -> None:
+        """
+        Recomputes the levels of `nodes`, a set that holds all its ancestors (private method).
+
+        Runs Kahn's algorithm on the subgraph of `nodes`; the components
+        outside it keep their level and act as already ordered leaves.
+        """
+        in_set = np.zeros(self.n_nodes, dtype=bool)
+        in_set[nodes] = True
+        lengths = self._parent_indptr[nodes + 1] - self._parent_indptr[nodes]
+        edge_parents = np.repeat(nodes, lengths)
+        edge_children = self.gather(self._parent_indptr, self.children, nodes)
+        inner = in_set[edge_children]
+
+        # Components outside the set fix a minimum level, or block the node if they depend on a cycle
+        outer_levels = self.levels[edge_children[~inner]]
+        minimum = np.zeros(self.n_nodes, dtype=np.int64)
+        np.maximum.at(minimum, edge_parents[~inner], outer_levels + 1)
+        blocked = np.zeros(self.n_nodes, dtype=bool)
+        blocked[edge_parents[~inner][outer_levels < 0]] = True
+
+        self.levels[nodes] = -1
+        pending = np.bincount(edge_parents[inner], minlength=self.n_nodes)
+        frontier = nodes[pending[nodes] == 0]
+        while frontier.size:
+            frontier = frontier[~blocked[frontier]]
+            self.levels[frontier] = minimum[frontier]
+            counts = self._child_indptr[frontier + 1] - self._child_indptr[frontier]
+            consumers = self.gather(self._child_indptr, self._parents_by_child, frontier)
+            np.maximum.at(minimum, consumers, np.repeat(minimum[frontier] + 1, counts))
+            pending -= np.bincount(consumers, minlength=self.n_nodes)
+            candidates = np.unique(consumers)
+            frontier = candidates[pending[candidates] == 0]
+
+    @property
+    def n_levels(self) -> int:
+        """
+        Number of BOM levels among the nodes that could be ordered.
+        """
+        return int(self.levels.max()) + 1 if self.n_nodes else 0
+
+    def nodes_at_level(self, level: int) -> np.ndarray:
+        """
+        Returns the codes of the nodes at `level`.
+
+        Parameters
+        ----------
+        level : int
+            The BOM level.
+
+        Returns
+        -------
+        np.ndarray
+            The node codes at that level.
+        """
+        return np.flatnonzero(self.levels == level)
+
+    def ancestors(self, nodes: np.ndarray) -> np.ndarray:
+        """
+        Returns `nodes` plus every node that consumes them, directly or indirectly.
+
+        Parameters
+        ----------
+        nodes : np.ndarray
+            Codes of the starting nodes.
+
+        Returns
+        -------
+        np.ndarray
+            Sorted codes of the starting nodes and all their ancestors.
+        """
+        seen = np.zeros(self.n_nodes, dtype=bool)
+        frontier = np.unique(np.asarray(nodes, dtype=np.int64))
+        seen[frontier] = True
+        while frontier.size:
+            consumers = np.unique(self.gather(self._child_indptr, self._parents_by_child, frontier))
+            frontier = consumers[~seen[consumers]]
+            seen[frontier] = True
+        return np.flatnonzero(seen)
+
+    def unordered_nodes(self) -> np.ndarray:
+        """
+        Returns the nodes that could not be ordered because they depend on a cycle.
+        """
+        return np.flatnonzero(self.levels < 0)
+
+    def strongly_connected_components(self) -> np.ndarray:
+        """
+        Labels the nodes that belong to a cycle with Tarjan's algorithm.
+
+        Only the nodes that Kahn's algorithm could not order are visited, so
+        the cost is linear and negligible for acyclic graphs.
+
+        Returns
+        -------
+        np.ndarray
+            Cycle label of every node, -1 for nodes outside any cycle.
+        """
+        labels = np.full(self.n_nodes, -1, dtype=np.int64)
+        candidates = self.unordered_nodes()
+        is_candidate = np.zeros(self.n_nodes, dtype=bool)
+        is_candidate[candidates] = True
+
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        n_cycles = 0
+
+        for root in candidates:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, self._parent_indptr[root])]
+            while work:
+                node, edge = work[-1]
+                if edge < self._parent_indptr[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    child = self.children[edge]
+                    if not is_candidate[child]:
+                        continue
+                    if child not in index:
+                        index[child] = low[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, self._parent_indptr[child]))
+                    elif child in on_stack:
+                        low[node] = min(low[node], index[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == node:
+                            break
+                    children = self.children[self._parent_indptr[node]:self._parent_indptr[node + 1]]
+                    if len(members) > 1 or node in children:
+                        labels[members] = n_cycles
+                        n_cycles += 1
+        return labels
+
+    def connected_components(self) -> np.ndarray:
+        """
+        Labels the weakly connected components of the graph.
+
+        Labels are propagated along edges in both directions and shortcut by
+        pointer jumping until they are stable.
+
+        Returns
+        -------
+        np.ndarray
+            Component label of every node, numbered from 0.
+        """
+        labels = np.arange(self.n_nodes)
+        while True:
+            previous = labels.copy()
+            np.minimum.at(labels, self.parents, labels[self.children])
+            np.minimum.at(labels, self.children, labels[self.parents])
+            labels = labels[labels]
+            if np.array_equal(labels, previous):
+                break
+        return np.unique(labels, return_inverse=True)[1]
+
+    def propagate_to_ancestors(self, nodes: np.ndarray, tags: np.ndarray) -> tuple:
+        """
+        Carries integer tags from `nodes` to every ancestor of those nodes.
+
+        Parameters
+        ----------
+        nodes : np.ndarray
+            Codes of the starting nodes.
+        tags : np.ndarray
+            Tag of each starting node (for instance, the cause that blocks it).
+
+        Returns
+        -------
+        tuple
+            (nodes, tags): every distinct (node, tag) pair reachable upwards,
+            starting pairs included.
+        """
+        n_tags = int(tags.max()) + 1 if len(tags) else 1
+        pairs = np.unique(np.asarray(nodes, dtype=np.int64) * n_tags + np.asarray(tags, dtype=np.int64))
+        seen = pairs
+        while pairs.size:
+            frontier_nodes, frontier_tags = np.divmod(pairs, n_tags)
+            starts = self._child_indptr[frontier_nodes]
+            lengths = self._child_indptr[frontier_nodes + 1] - starts
+            consumers = self.gather(self._child_indptr, self._parents_by_child, frontier_nodes)
+            candidates = np.unique(consumers * n_tags + np.repeat(frontier_tags, lengths))
+            pairs = candidates[~np.isin(candidates, seen, assume_unique=True)]
+            seen = np.union1d(seen, pairs)
+        return np.divmod(seen, n_tags)
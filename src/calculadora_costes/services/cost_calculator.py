@@ -1,12 +1,45 @@
+import contextlib
+import gc
+import hashlib
+import os
+import sys
+import time
+import numpy as np
 import pandas as pd
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from calculadora_costes.services.bom_graph import BomGraph
+from calculadora_costes.services.cost_lookup import CostLookup
+from calculadora_costes.services.inventory_costing import InventoryCosting
+from calculadora_costes.services.price_index import PriceIndex
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
 
 class CostCalculator:
     """
     Class for recursively calculating manufacturing costs.
+
+    The product lot -> component lot graph is built once on construction and
+    ordered topologically, so costs are rolled up level by level in a single pass.
+
+    Progress is reported as structured records (stage, duration, rows resolved,
+    peak memory) to the registered callbacks; console output can be turned off.
     """
+
+    # Order and component label of the rows that bring carried SEM lot costs into a partition
+    CARRIED_ORDER = 'ARRASTRE'
+
+    # Article and lot codes are int32, so article * stride + lot is a unique int64 lot key
+    _LOT_KEY_STRIDE = 2**31
     
-    def __init__(self, fabricaciones: pd.DataFrame):
+    def __init__(self,
+                 fabricaciones: pd.DataFrame,
+                 verbose: bool = True,
+                 callbacks: Optional[List[Callable[[Dict], None]]] = None,
+                 copy: bool = True):
         """
         Initializes the cost calculator.
         
@@ -16,186 +49,2375 @@ class CostCalculator:
             DataFrame with fabrications and their components. Must contain the columns:
             - componente
             - coste_componente_unitario
+        verbose : bool, default True
+            If False, nothing is printed to the console.
+        callbacks : list of callables, optional
+            Functions called with every progress record (a dict with at least
+            'etapa', 'segundos' and 'memoria_pico_mb').
+        copy : bool, default True
+            If False, the calculator works on `fabricaciones` itself instead
+            of a copy, and the frame is modified in place.
             
         Returns
         -------
         CostCalculator
             The initialized cost calculator.
         """
-        self.fabricaciones = fabricaciones.copy()
-        
-        # Initialize cost_calculated flag
-        # Components not starting with 'SEM' already have calculated cost
-        self.fabricaciones['flag_coste_calculado'] = ~self.fabricaciones['componente'].str.startswith('SEM')
+        self.verbose = verbose
+        self._callbacks = list(callbacks or [])
+        self._events = []
+
+        with self._stage('construccion') as record:
+            self.fabricaciones = fabricaciones.copy() if copy else fabricaciones
+            
+            # Initialize cost_calculated flag
+            # Components not starting with 'SEM' already have calculated cost
+            self.fabricaciones['flag_coste_calculado'] = ~self.fabricaciones['componente'].str.startswith('SEM')
+
+            self._build_graph()
+            record.update(registros=len(self.fabricaciones), lotes=len(self._lots), niveles=self.graph.n_levels)
         
         # Print initial state
-        false_flag_num = len(self.fabricaciones) - self.fabricaciones['flag_coste_calculado'].sum()
-        print(f"Estado inicial: {false_flag_num} registros pendientes de calcular coste")
+        pending = ~self.fabricaciones['flag_coste_calculado'].to_numpy(dtype=bool)
+        self._log(f"Estado inicial: {pending.sum()} registros pendientes de calcular coste")
         
         # Optional control: show summary by product type
-        control = (self.fabricaciones
-                  .groupby('articulo')
-                  .agg({'flag_coste_calculado': 'all'})
-                  .reset_index()
-                  .groupby('flag_coste_calculado')
-                  .agg({'articulo': 'count'})
-                  .reset_index())
+        rows_by_article = np.bincount(self._articulo_codes, minlength=len(self._items))
+        pending_by_article = np.bincount(self._articulo_codes, weights=pending, minlength=len(self._items))
+        control = {
+            'pendientes': np.count_nonzero((rows_by_article > 0) & (pending_by_article > 0)),
+            'calculados': np.count_nonzero((rows_by_article > 0) & (pending_by_article == 0))
+        }
         
-        print("\nResumen por estado de cálculo:")
-        for _, row in control.iterrows():
-            status = "calculados" if row['flag_coste_calculado'] else "pendientes"
-            print(f"Artículos {status}: {row['articulo']}")
+        self._log("\nResumen por estado de cálculo:")
+        for status, count in control.items():
+            if count:
+                self._log(f"Artículos {status}: {count}")
 
-    def calculate_costs_recursively(self, max_iterations: int = 6) -> pd.DataFrame:
+    def add_callback(self, callback: Callable[[Dict], None]) -> 'CostCalculator':
         """
-        Recursively calculates component costs based on fabrications.
-        
+        Registers a function that receives every progress record.
+
+        Parameters
+        ----------
+        callback : callable
+            Function called with each record (dict).
+
+        Returns
+        -------
+        CostCalculator
+            The same instance.
+        """
+        self._callbacks.append(callback)
+        return self
+
+    def get_events(self) -> pd.DataFrame:
+        """
+        Returns every progress record emitted so far, one row per record.
+        """
+        return pd.DataFrame(self._events)
+
+    def _log(self, message: str) -> None:
+        """
+        Prints `message` unless the calculator is silent (private method).
+        """
+        if self.verbose:
+            print(message)
+
+    def _emit(self, record: Dict) -> None:
+        """
+        Stores a progress record and hands it to the callbacks (private method).
+        """
+        self._events.append(record)
+        for callback in self._callbacks:
+            callback(record)
+
+    @staticmethod
+    def _peak_memory_mb() -> Optional[float]:
+        """
+        Returns the peak resident memory of the process in MB, None if unavailable (private method).
+        """
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+    @contextlib.contextmanager
+    def _stage(self, etapa: str, **fields):
+        """
+        Times a stage and emits its record when it ends (private method).
+
+        The record is yielded so the stage can add its own fields.
+        """
+        record = {'etapa': etapa, **fields}
+        start = time.perf_counter()
+        yield record
+        record['segundos'] = time.perf_counter() - start
+        record['memoria_pico_mb'] = self._peak_memory_mb()
+        self._emit(record)
+
+    def _build_graph(self) -> None:
+        """
+        Builds the lot dependency graph and the row indexes used by the rollup (private method).
+
+        Nodes are product lots (articulo, lote_articulo). A row depends on the
+        lot it consumes (componente, lote_componente) when that lot is
+        manufactured in the frame. Rows whose lot was never manufactured fall
+        back to another lot of the same article (see `_fallback_lots`) and
+        are flagged in the column flag_lote_sustituido.
+        """
+        self._encode_keys()
+
+        # Lot keys combine article and lot codes; sorted, so lots follow (articulo, lote_articulo)
+        lot_keys = self._lot_keys(self._articulo_codes, self._lote_articulo_codes)
+        self._component_keys = self._lot_keys(self._componente_codes, self._lote_componente_codes)
+        lot_codes, lot_keys = pd.factorize(lot_keys, sort=True)
+        self._lot_index = pd.Index(lot_keys)
+        component_lot_codes = self._lot_index.get_indexer(self._component_keys)
+        self._lots = self._lot_labels(lot_keys)
+
+        # Date of every lot: its first fabrication
+        fechas = self.fabricaciones['fecha_fabricacion'].to_numpy().astype('datetime64[D]')
+        self._lot_dates = np.full(len(self._lots), np.datetime64('NaT'), dtype='datetime64[D]')
+        np.fmin.at(self._lot_dates, lot_codes, fechas)
+
+        # Fallback: the lot of the same article closest before the row's date
+        unmatched = np.flatnonzero((component_lot_codes < 0) & (self._componente_codes >= 0))
+        component_lot_codes[unmatched] = self._fallback_lots(self._componente_codes[unmatched], fechas[unmatched])
+        substituted = np.zeros(len(lot_codes), dtype=bool)
+        substituted[unmatched] = component_lot_codes[unmatched] >= 0
+        self.fabricaciones['flag_lote_sustituido'] = substituted
+
+        self._lot_codes = lot_codes
+        self._component_lot_codes = component_lot_codes
+        manufactured = component_lot_codes >= 0
+
+        self.graph = BomGraph(
+            lot_codes[manufactured],
+            component_lot_codes[manufactured],
+            len(self._lots)
+        )
+
+        # Where-used index: (componente, lote_componente) lot code -> row positions
+        consuming_rows = np.flatnonzero(manufactured)
+        order = np.argsort(component_lot_codes[consuming_rows], kind='stable')
+        self._where_used_rows = consuming_rows[order]
+        self._where_used_indptr = BomGraph.indptr(component_lot_codes[consuming_rows], len(self._lots))
+
+        # Order index: order codes follow (fecha_fabricacion, id_orden), so order outputs come out sorted.
+        # Rows without id_orden get code -1 and belong to no order.
+        order_codes, orders = pd.factorize(self.fabricaciones['id_orden'])
+        ordered = np.flatnonzero(order_codes >= 0)
+        first_rows = ordered[np.unique(order_codes[ordered], return_index=True)[1]]
+        by_date = np.lexsort((
+            np.asarray(orders, dtype=object),
+            self.fabricaciones['fecha_fabricacion'].to_numpy()[first_rows]
+        ))
+        ranks = np.empty_like(by_date)
+        ranks[by_date] = np.arange(len(by_date))
+        self._order_codes = np.full(len(order_codes), -1, dtype=np.int64)
+        self._order_codes[ordered] = ranks[order_codes[ordered]]
+        self._orders = orders[by_date]
+        self._rows_by_order = ordered[np.argsort(self._order_codes[ordered], kind='stable')]
+        self._order_indptr = BomGraph.indptr(self._order_codes[ordered], len(self._orders))
+
+        # Lot index: lot code -> row positions of its components
+        self._rows_by_lot = np.argsort(lot_codes, kind='stable')
+        self._lot_indptr = BomGraph.indptr(lot_codes, len(self._lots))
+
+        # Row positions sorted by the level of their product (-1 = depends on a cycle)
+        row_levels = self.graph.levels[lot_codes]
+        self._rows_by_level = np.argsort(row_levels, kind='stable')
+        self._level_indptr = BomGraph.indptr(row_levels[self._rows_by_level] + 1, self.graph.n_levels + 1)
+
+    def _encode_keys(self) -> None:
+        """
+        Factorizes article and lot columns into shared int32 code spaces (private method).
+
+        articulo and componente share one sorted code space and lote_articulo
+        and lote_componente another, so every grouping and match runs on
+        integers and labels are decoded only on output.
+        """
+        n_rows = len(self.fabricaciones)
+        item_codes, self._items = pd.factorize(
+            pd.concat([self.fabricaciones['articulo'], self.fabricaciones['componente']], ignore_index=True),
+            sort=True
+        )
+        lote_codes, self._lotes = pd.factorize(
+            pd.concat([self.fabricaciones['lote_articulo'], self.fabricaciones['lote_componente']], ignore_index=True),
+            sort=True
+        )
+        item_codes = item_codes.astype(np.int32)
+        lote_codes = lote_codes.astype(np.int32)
+        self._articulo_codes, self._componente_codes = item_codes[:n_rows], item_codes[n_rows:]
+        self._lote_articulo_codes, self._lote_componente_codes = lote_codes[:n_rows], lote_codes[n_rows:]
+
+    def _lot_keys(self, item_codes: np.ndarray, lote_codes: np.ndarray) -> np.ndarray:
+        """
+        Combines article and lot codes into one int64 key per row, -1 when either is missing (private method).
+        """
+        keys = item_codes.astype(np.int64) * self._LOT_KEY_STRIDE + lote_codes
+        return np.where((item_codes < 0) | (lote_codes < 0), -1, keys)
+
+    def _lot_labels(self, lot_keys: np.ndarray) -> pd.MultiIndex:
+        """
+        Decodes lot keys into the (articulo, lote_articulo) index of the lots (private method).
+        """
+        item_codes, lote_codes = np.divmod(lot_keys, self._LOT_KEY_STRIDE)
+        return pd.MultiIndex(
+            levels=[self._items, self._lotes],
+            codes=[item_codes, lote_codes],
+            names=['articulo', 'lote_articulo'],
+            verify_integrity=False
+        )
+
+    def _encode_lot(self, articulo, lote) -> np.ndarray:
+        """
+        Returns the int64 keys of (articulo, lote) labels, -1 for unknown labels (private method).
+        """
+        return self._lot_keys(
+            self._items.get_indexer(np.atleast_1d(articulo)),
+            self._lotes.get_indexer(np.atleast_1d(lote))
+        )
+
+    def _fallback_lots(self, item_codes: np.ndarray, fechas: np.ndarray) -> np.ndarray:
+        """
+        Picks the lot used by rows whose component lot was never manufactured (private method).
+
+        The fallback is the last lot of the same article manufactured on or
+        before the row's date, or its first lot when every lot is later. Lots
+        are dated by their first fabrication and ranked by label within a
+        day; labels alone do not follow the date (SEM lots are DDMMYY).
+
+        Parameters
+        ----------
+        item_codes : np.ndarray
+            Article code of the component of each row.
+        fechas : np.ndarray
+            fecha_fabricacion of each row, as datetime64[D].
+
+        Returns
+        -------
+        np.ndarray
+            Lot code of each row, -1 when the article has no manufactured lot.
+        """
+        fallback = np.full(len(item_codes), -1, dtype=np.int64)
+        lot_items, lot_lotes = np.divmod(self._lot_index.to_numpy(), self._LOT_KEY_STRIDE)
+        candidates = np.flatnonzero(np.isin(lot_items, item_codes))
+        if not len(candidates) or not len(item_codes):
+            return fallback
+
+        # Days since the earliest date; undated lots and rows go after every date
+        lot_days, row_days = self._lot_dates[candidates], np.asarray(fechas, dtype='datetime64[D]')
+        known = np.concatenate([lot_days[~np.isnat(lot_days)], row_days[~np.isnat(row_days)]]).astype(np.int64)
+        origin, undated = (known.min(), known.max() - known.min() + 1) if len(known) else (0, 0)
+        lot_days = np.where(np.isnat(lot_days), undated, lot_days.astype(np.int64) - origin)
+        row_days = np.where(np.isnat(row_days), undated, row_days.astype(np.int64) - origin)
+
+        labels = pd.factorize(self._lotes[lot_lotes[candidates]], sort=True)[0]
+        order = np.lexsort((labels, lot_days, lot_items[candidates]))
+        candidates = candidates[order]
+        keys = lot_items[candidates] * (undated + 1) + lot_days[order]
+
+        before = np.searchsorted(keys, item_codes * (undated + 1) + row_days, side='right') - 1
+        first = np.minimum(np.searchsorted(keys, item_codes * (undated + 1), side='left'), len(keys) - 1)
+        has_before = (before >= 0) & (lot_items[candidates[np.maximum(before, 0)]] == item_codes)
+        has_after = lot_items[candidates[first]] == item_codes
+        fallback[has_before] = candidates[before[has_before]]
+        fallback[~has_before & has_after] = candidates[first[~has_before & has_after]]
+        return fallback
+
+    def where_used(self, componente: str, lote_componente: str) -> np.ndarray:
+        """
+        Returns the row positions that consume a manufactured lot.
+
+        Parameters
+        ----------
+        componente : str
+            Article code of the manufactured lot.
+        lote_componente : str
+            Lot of the manufactured article.
+
+        Returns
+        -------
+        np.ndarray
+            Row positions of `fabricaciones` whose cost depends on that lot.
+        """
+        code = self._lot_index.get_indexer(self._encode_lot(componente, lote_componente))
+        return BomGraph.gather(self._where_used_indptr, self._where_used_rows, code)
+
+    def apply_asof_prices(self, price_index: PriceIndex) -> 'CostCalculator':
+        """
+        Prices every purchased component with the price valid on its fabrication date.
+
+        Replaces the exact-lot price of each purchased row with the last price
+        of that component purchased on or before `fecha_fabricacion`, through
+        one vectorized as-of lookup. Rows without an earlier price keep their
+        current price.
+
+        Parameters
+        ----------
+        price_index : PriceIndex
+            Dated purchase history, for instance built from
+            `Parameters.costes_historico`.
+
+        Returns
+        -------
+        CostCalculator
+            The same instance, with purchased component prices updated.
+        """
+        with self._stage('precios_a_fecha') as record:
+            leaf = np.flatnonzero(self._component_lot_codes < 0)
+            prices = price_index.asof(
+                self._items.take(self._componente_codes[leaf], allow_fill=True),
+                self.fabricaciones['fecha_fabricacion'].to_numpy()[leaf]
+            )
+            found = ~np.isnan(prices)
+            column = self.fabricaciones.columns.get_loc('coste_componente_unitario')
+            self.fabricaciones.iloc[leaf[found], column] = prices[found]
+            record.update(registros_con_precio=int(found.sum()), registros_comprados=len(leaf))
+
+        self._log("\nPrecios a fecha:")
+        self._log(f"Registros con precio a fecha: {found.sum()} de {len(leaf)}")
+        return self
+
+    def impute_missing_prices(self, price_index: PriceIndex) -> 'CostCalculator':
+        """
+        Fills purchased components without price with the price of the closest earlier lot.
+
+        Rows whose exact lot found no price (typically a failed merge on
+        clave_merge) take the price of the last purchase lot of the same
+        component on or before their `lote_componente`, through one
+        vectorized lookup. Imputed rows are flagged in the column
+        `precio_imputado`.
+
+        Parameters
+        ----------
+        price_index : PriceIndex
+            Purchase prices ordered by lot, for instance
+            `PriceIndex(costes, date_column='lote_componente')`.
+
+        Returns
+        -------
+        CostCalculator
+            The same instance, with missing purchased component prices filled.
+        """
+        with self._stage('imputacion') as record:
+            coste = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)
+            missing = np.flatnonzero((self._component_lot_codes < 0) & np.isnan(coste))
+            prices = price_index.asof(
+                self._items.take(self._componente_codes[missing], allow_fill=True),
+                self._lotes.take(self._lote_componente_codes[missing], allow_fill=True)
+            )
+            found = ~np.isnan(prices)
+            column = self.fabricaciones.columns.get_loc('coste_componente_unitario')
+            self.fabricaciones.iloc[missing[found], column] = prices[found]
+
+            imputed = np.zeros(len(self.fabricaciones), dtype=bool)
+            if 'precio_imputado' in self.fabricaciones.columns:
+                imputed = self.fabricaciones['precio_imputado'].to_numpy(dtype=bool, copy=True)
+            imputed[missing[found]] = True
+            self.fabricaciones['precio_imputado'] = imputed
+            record.update(registros_sin_precio=len(missing), registros_imputados=int(found.sum()))
+
+        self._log("\nImputación de precios por lote anterior:")
+        self._log(f"Registros imputados: {found.sum()} de {len(missing)} sin precio")
+        return self
+
+    def apply_inventory_costing(self, costing: InventoryCosting, method: str = 'moving_average') -> 'CostCalculator':
+        """
+        Prices purchased components with an inventory costing method instead of the exact lot.
+
+        The consumption of every purchased row (`consumo_total` on
+        `fecha_fabricacion`) is valued against the purchase history, with
+        orders taken in date order. Rows that cannot be valued keep their
+        current price.
+
+        Parameters
+        ----------
+        costing : InventoryCosting
+            Purchase history with units, for instance built from
+            `Parameters.costes_historico`.
+        method : str, default 'moving_average'
+            'moving_average' (weighted moving average) or 'fifo'.
+
+        Returns
+        -------
+        CostCalculator
+            The same instance, with purchased component prices updated.
+        """
+        if method not in ('moving_average', 'fifo'):
+            raise ValueError(f"Método de valoración desconocido: {method}. Usa 'moving_average' o 'fifo'.")
+
+        with self._stage('valoracion_inventario', metodo=method) as record:
+            leaf = np.flatnonzero(self._component_lot_codes < 0)
+            leaf = leaf[np.argsort(self._order_codes[leaf], kind='stable')]
+            engine = costing.fifo if method == 'fifo' else costing.moving_average
+            prices = engine(
+                self._items.take(self._componente_codes[leaf], allow_fill=True),
+                self.fabricaciones['fecha_fabricacion'].to_numpy()[leaf],
+                self.fabricaciones['consumo_total'].to_numpy(dtype=float)[leaf]
+            )
+            found = ~np.isnan(prices)
+            column = self.fabricaciones.columns.get_loc('coste_componente_unitario')
+            self.fabricaciones.iloc[leaf[found], column] = prices[found]
+            record.update(registros_valorados=int(found.sum()), registros_comprados=len(leaf))
+
+        self._log(f"\nValoración de inventario ({method}):")
+        self._log(f"Registros valorados: {found.sum()} de {len(leaf)}")
+        return self
+
+    def calculate_costs_recursively(self,
+                                    max_iterations: Optional[int] = None,
+                                    solver: str = 'levels',
+                                    n_jobs: int = 1,
+                                    cache_path: Optional[str] = None,
+                                    checkpoint_path: Optional[str] = None,
+                                    store_path: Optional[str] = None,
+                                    force: bool = False
+                                   ) -> pd.DataFrame:
+        """
+        Calculates component costs level by level following the BOM topological order.
+
+        Every level is visited once, so each row is scanned a single time no
+        matter how deep the BOM is.
+
         Parameters
         ----------
-        max_iteraciones : int, optional
-            Maximum number of iterations to avoid infinite loops, by default 6
+        max_iterations : int, optional
+            Maximum number of BOM levels to roll up, by default None (all levels)
+        solver : str, optional
+            'levels' (default) groups the rows of each level with pandas.
+            'sparse' encodes consumption as a sparse lot x component lot matrix
+            and solves all lot costs by triangular back-substitution on arrays.
+        n_jobs : int, optional
+            Number of worker processes, by default 1. With more than one, the
+            BOM graph is split into independent connected components that are
+            costed in parallel and merged back into one frame.
+        cache_path : str, optional
+            File of the persistent lot cost cache used by the 'levels' solver.
+            Lots whose inputs (component lots, consumptions, purchase prices and
+            the inputs of their semi-finished components) did not change since
+            a previous run reuse the stored cost. Requires n_jobs=1. By default
+            no cache is used.
+        checkpoint_path : str, optional
+            File where the 'levels' solver saves the resolved lot costs after
+            every BOM level. A run interrupted midway resumes from it when
+            called again with the same data. By default no checkpoint is kept.
+        store_path : str, optional
+            Directory of the result store. The result of every run is saved
+            under the fingerprint of its inputs, and a run whose fingerprint is
+            already stored returns that result without rolling up. By default
+            no store is used.
+        force : bool, default False
+            If True, recalculates even when the store holds the result.
             
         Returns
         -------
         pd.DataFrame
             DataFrame with the calculated costs
         """
-        previous_nulls = float('inf')
-        
-        for i in range(max_iterations):
-            nulls = self.fabricaciones['coste_componente_unitario'].isna().sum()
-            print(f"\n{i+1}ª iteración:")
-            print(f"Registros sin coste: {nulls}")
-            
-            if nulls == 0:
-                print("Todos los costes han sido calculados.")
-                break
-                
-            if nulls >= previous_nulls:
-                print("No se pueden calcular más costes.")
-                break
-                
-            previous_nulls = nulls
-            
-            # Identify calculable products
-            calculable_products = (
-                self.fabricaciones
-                .groupby(['articulo', 'lote_articulo'])
-                .agg({'coste_componente_unitario': lambda x: x.notna().all()})
-                .reset_index()
-            )
-            
-            calculables = calculable_products[
-                calculable_products['coste_componente_unitario']
-            ][['articulo', 'lote_articulo']]
-            
-            # Calculate costs for calculable products
-            for _, producto in calculables.iterrows():
-                self._calculate_product_cost(producto)
-            
+        if solver not in ('levels', 'sparse'):
+            raise ValueError(f"Solver desconocido: {solver}. Usa 'levels' o 'sparse'.")
+        if cache_path is not None and (solver != 'levels' or n_jobs > 1):
+            raise ValueError("La caché de costes solo está disponible con solver='levels' y n_jobs=1.")
+        if checkpoint_path is not None and (solver != 'levels' or n_jobs > 1):
+            raise ValueError("Los checkpoints solo están disponibles con solver='levels' y n_jobs=1.")
+
+        n_levels = self.graph.n_levels
+        if max_iterations is not None and max_iterations < n_levels:
+            self._log(f"ADVERTENCIA: La estructura tiene {n_levels} niveles, solo se calcularán {max_iterations}.")
+            n_levels = max_iterations
+
+        with self._stage('calculo', solver=solver, n_jobs=n_jobs) as record:
+            stored = None
+            if store_path is not None:
+                stored = os.path.join(store_path, f"{self.fingerprint(n_levels)}.npz")
+
+            reused = stored is not None and not force and os.path.exists(stored)
+            if reused:
+                self._load_result(stored)
+            else:
+                self._calculate(n_levels, max_iterations, solver, n_jobs, cache_path, checkpoint_path)
+                if stored is not None:
+                    self._save_result(stored)
+
             # Update flags
             self.fabricaciones['flag_coste_calculado'] = self.fabricaciones['coste_componente_unitario'].notna()
+            self._record_rollup()
+            record.update(
+                lotes_calculados=int(np.count_nonzero(~np.isnan(self._lot_costs))),
+                registros_sin_coste=int(np.isnan(self._row_costs).sum()),
+                reutilizado=reused
+            )
         
         self._print_concise_summary()
         return self.fabricaciones
-    
-    def _calculate_product_cost(self, producto: pd.Series) -> None:
+
+    def _calculate(self,
+                   n_levels: int,
+                   max_iterations: Optional[int],
+                   solver: str,
+                   n_jobs: int,
+                   cache_path: Optional[str],
+                   checkpoint_path: Optional[str]) -> None:
         """
-        Calculates the cost of a specific product and updates related records (private method).
-        
+        Runs the rollup with the requested solver (private method).
+
+        See `calculate_costs_recursively` for the parameters.
+        """
+        # Blocked subgraphs are found once and skipped by the rollup
+        self.diagnose_dependencies()
+
+        if n_jobs > 1:
+            self._calculate_in_parallel(n_jobs, max_iterations, solver)
+        elif solver == 'sparse':
+            self._lot_costs = self._solve_sparse(n_levels)
+            self._propagate_lot_costs(np.arange(len(self._lots)))
+            self._log(f"\nLotes calculados: {np.count_nonzero(~np.isnan(self._lot_costs))} de {len(self._lots)}")
+        else:
+            # Input hashes are shared by the cache and the checkpoint
+            lot_hashes = None
+            if cache_path is not None or checkpoint_path is not None:
+                lot_hashes = self._lot_input_hashes()
+            cached = self._load_cost_cache(cache_path, lot_hashes) if cache_path is not None else None
+            self._calculate_by_levels(n_levels, cached, checkpoint_path, lot_hashes)
+            if cache_path is not None:
+                self._save_cost_cache(cache_path, lot_hashes)
+
+    def fingerprint(self, n_levels: Optional[int] = None) -> str:
+        """
+        Returns a fingerprint of the inputs of the rollup.
+
+        Row hashes are computed column-wise with `pd.util.hash_pandas_object`
+        over the columns the rollup reads (purchase prices included) and
+        digested in row order, so any change of data or order changes it.
+
         Parameters
         ----------
-        producto : pd.Series
-            Series with the 'articulo' and 'lote_articulo' of the product to calculate
+        n_levels : int, optional
+            Number of BOM levels rolled up, by default all of them.
+
+        Returns
+        -------
+        str
+            Hexadecimal digest.
         """
-        # Filter components of the current product
-        mask_product = (
-            (self.fabricaciones['articulo'] == producto['articulo']) & 
-            (self.fabricaciones['lote_articulo'] == producto['lote_articulo'])
-        )
-        
-        product_components = self.fabricaciones[mask_product].copy()
-        
-       # Calculate total cost of the product
-        total_cost = (
-            product_components['consumo_unitario'] * 
-            product_components['coste_componente_unitario']
-        ).sum()
-        
-        # Identify where this product is used as a component
-        mask_as_component = (
-            self.fabricaciones['componente'].astype(str) == producto['articulo']
-        )
-        
-        # Update costs where this product is used as a component
-        if mask_as_component.any():
-            self.fabricaciones.loc[mask_as_component, 'coste_componente_unitario'] = total_cost
-            self.fabricaciones.loc[mask_as_component, 'flag_coste_calculado'] = True
-    
-    def _print_concise_summary(self) -> None:
+        n_levels = self.graph.n_levels if n_levels is None else n_levels
+        leaf = self._component_lot_codes < 0
+        columns = ['id_orden', 'fecha_fabricacion', 'articulo', 'lote_articulo', 'unidades_fabricadas',
+                   'componente', 'lote_componente', 'consumo_unitario']
+        row_hashes = pd.util.hash_pandas_object(self.fabricaciones[columns].assign(
+            coste=np.where(leaf, self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float), np.nan)
+        ), index=False).to_numpy()
+
+        digest = hashlib.blake2b(row_hashes.tobytes(), digest_size=16)
+        digest.update(str(n_levels).encode())
+        return digest.hexdigest()
+
+    def _save_result(self, path: str) -> None:
         """
-        Prints a summary of the final cost calculation status (private method).
+        Stores the row and lot costs of the last rollup in the result store (private method).
         """
-        nulos_final = self.fabricaciones['coste_componente_unitario'].isna().sum()
-        print("\nResumen final:")
-        print(f"Total registros: {len(self.fabricaciones)}")
-        print(f"Registros sin coste: {nulos_final}")
-        print(f"Registros con coste calculado: {len(self.fabricaciones) - nulos_final}")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as file:
+            np.savez_compressed(
+                file,
+                costes=self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+                lot_costs=self._lot_costs
+            )
+        os.replace(temporary, path)
 
-    def generate_manufacturing_costs(self) -> pd.DataFrame:
+    def _load_result(self, path: str) -> None:
         """
-        Generates a summarized DataFrame with manufacturing costs per order.
-        
-        This method:
-        1. Calculates the unit cost per component
-        2. Groups by manufacturing order
-        3. Sums the total costs
-        4. Sorts by date
-        
+        Restores the row and lot costs of an identical previous run (private method).
+        """
+        with np.load(path) as result:
+            self.fabricaciones['coste_componente_unitario'] = result['costes']
+            self._lot_costs = result['lot_costs'].copy()
+        self._log("\nResultado reutilizado del almacén: las entradas no han cambiado")
+
+    def _calculate_in_parallel(self, n_jobs: int, max_iterations: Optional[int], solver: str) -> None:
+        """
+        Costs independent BOM components in worker processes and merges the results (private method).
+
+        Components are spread over `n_jobs` partitions of similar row count;
+        each partition is a self-contained fabrication frame.
+
+        Parameters
+        ----------
+        n_jobs : int
+            Number of worker processes.
+        max_iterations : int, optional
+            Maximum number of BOM levels to roll up in each partition.
+        solver : str
+            Solver used by the workers.
+        """
+        components = self.graph.connected_components()
+        row_components = components[self._lot_codes]
+        sizes = np.bincount(row_components)
+
+        # Largest components first, dealt round-robin over the partitions
+        ranks = np.empty_like(sizes)
+        ranks[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+        row_partitions = (ranks % n_jobs)[row_components]
+        partitions = [np.flatnonzero(row_partitions == p) for p in range(min(n_jobs, len(sizes)))]
+
+        self._log(f"\nComponentes independientes: {len(sizes)} en {len(partitions)} procesos")
+
+        self._lot_costs = np.full(len(self._lots), np.nan)
+        column = self.fabricaciones.columns.get_loc('coste_componente_unitario')
+        with ProcessPoolExecutor(max_workers=len(partitions)) as executor:
+            results = executor.map(
+                CostCalculator._calculate_partition,
+                [self.fabricaciones.iloc[positions] for positions in partitions],
+                [max_iterations] * len(partitions),
+                [solver] * len(partitions)
+            )
+            for positions, (costs, lot_costs) in zip(partitions, results):
+                self.fabricaciones.iloc[positions, column] = costs
+                self._lot_costs[self._lots.get_indexer(lot_costs.index)] = lot_costs.to_numpy()
+
+    @staticmethod
+    def _calculate_partition(fabricaciones: pd.DataFrame, max_iterations: Optional[int], solver: str) -> tuple:
+        """
+        Costs one partition of the fabrication frame inside a worker process (private method).
+
+        Returns
+        -------
+        tuple
+            (costs, lot_costs): the coste_componente_unitario column of the
+            partition and the unit cost of its lots indexed by (articulo, lote_articulo).
+        """
+        calculator = CostCalculator(fabricaciones, verbose=False)
+        result = calculator.calculate_costs_recursively(max_iterations=max_iterations, solver=solver)
+        return (
+            result['coste_componente_unitario'].to_numpy(),
+            pd.Series(calculator._lot_costs, index=calculator._lots)
+        )
+
+    def diagnose_dependencies(self) -> pd.DataFrame:
+        """
+        Finds the product lots that can never be costed and what blocks them.
+
+        Runs in linear time on the BOM graph: cycles are labelled with Tarjan's
+        algorithm and purchased components without price are carried upwards
+        to every lot that depends on them.
+
         Returns
         -------
         pd.DataFrame
-            DataFrame with the columns:
-            - id_orden
-            - fecha_fabricacion
+            DataFrame with one row per blocked lot and cause, with the columns:
             - articulo
-            - unidades_fabricadas
-            - coste_total_fabricacion
+            - lote_articulo
+            - motivo: 'ciclo' or 'precio_faltante'
+            - ciclo: label of the blocking cycle (NaN for missing prices)
+            - componente: component without price (NaN for cycles)
+            - lote_componente: lot without price (NaN for cycles)
         """
-        # Verify that all costs have been calculated
-        if self.fabricaciones['coste_componente_unitario'].isna().any():
-            print("ADVERTENCIA: Hay costes pendientes de calcular. Los resultados pueden ser incompletos.")
-        
-        # Calculate unit cost per component
-        df = self.fabricaciones.copy()
-        df['coste_unitario'] = (
-            df['coste_componente_unitario'] * 
-            df['consumo_unitario']
-        )
-        
-        # Group by order and sum costs
-        costes_fabricacion = (
-            df
-            .groupby([
-                'id_orden',
-                'fecha_fabricacion',
-                'articulo',
-                'unidades_fabricadas'
-            ])['coste_unitario']
-            .sum()
-            .reset_index()
-        )
-        # Sort by date
-        costes_fabricacion = costes_fabricacion.sort_values(
-            'fecha_fabricacion',
-            ascending=True
-        )
-        
-        # Reset index after sorting
-        costes_fabricacion = costes_fabricacion.reset_index(drop=True)
-        
-        print("\nResumen de costes de fabricación:")
-        print(f"Total órdenes procesadas: {len(costes_fabricacion)}")
-        print(f"Rango de fechas: {costes_fabricacion['fecha_fabricacion'].min()} a {costes_fabricacion['fecha_fabricacion'].max()}")
-        
-        return costes_fabricacion
\ No newline at end of file
+        with self._stage('diagnostico') as record:
+            coste = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)
+            missing_rows = np.flatnonzero((self._component_lot_codes < 0) & np.isnan(coste))
+            missing_codes, missing_pairs = pd.factorize(
+                self._componente_codes[missing_rows].astype(np.int64) * (len(self._lotes) + 1)
+                + self._lote_componente_codes[missing_rows] + 1
+            )
+            missing_items, missing_lotes = np.divmod(missing_pairs, len(self._lotes) + 1)
+            missing_keys = pd.MultiIndex.from_arrays([
+                self._items.take(missing_items, allow_fill=True),
+                self._lotes.take(missing_lotes - 1, allow_fill=True)
+            ])
+
+            cycle_labels = self.graph.strongly_connected_components()
+            in_cycle = np.flatnonzero(cycle_labels >= 0)
+            n_missing = len(missing_keys)
+
+            blocked_nodes, causes = self.graph.propagate_to_ancestors(
+                np.concatenate([self._lot_codes[missing_rows], in_cycle]),
+                np.concatenate([missing_codes, n_missing + cycle_labels[in_cycle]])
+            )
+            by_cycle = causes >= n_missing
+            price_causes = missing_keys[np.where(by_cycle, 0, causes)] if n_missing else None
+
+            blocked_lots = self._lots[blocked_nodes]
+            self._blocked = pd.DataFrame({
+                'articulo': blocked_lots.get_level_values('articulo'),
+                'lote_articulo': blocked_lots.get_level_values('lote_articulo'),
+                'motivo': np.where(by_cycle, 'ciclo', 'precio_faltante'),
+                'ciclo': np.where(by_cycle, causes - n_missing, np.nan),
+                'componente': np.where(by_cycle, None, price_causes.get_level_values(0) if n_missing else None),
+                'lote_componente': np.where(by_cycle, None, price_causes.get_level_values(1) if n_missing else None)
+            })
+            self._blocked_lots = np.zeros(len(self._lots), dtype=bool)
+            self._blocked_lots[blocked_nodes] = True
+
+            cycle_lots = self._lots[in_cycle]
+            self._cycles = pd.DataFrame({
+                'ciclo': cycle_labels[in_cycle],
+                'articulo': cycle_lots.get_level_values('articulo'),
+                'lote_articulo': cycle_lots.get_level_values('lote_articulo')
+            }).sort_values('ciclo', ignore_index=True)
+            record.update(ciclos=int(self._cycles['ciclo'].nunique()), precios_faltantes=n_missing,
+                          lotes_bloqueados=int(self._blocked_lots.sum()))
+
+        self._log("\nDiagnóstico de dependencias:")
+        self._log(f"Ciclos detectados: {self._cycles['ciclo'].nunique()}")
+        self._log(f"Lotes de componentes sin precio: {n_missing}")
+        self._log(f"Lotes bloqueados: {self._blocked_lots.sum()}")
+
+        return self._blocked
+
+    def get_cycles(self) -> pd.DataFrame:
+        """
+        Returns the product lots that form each cycle found by `diagnose_dependencies`.
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame with the columns ciclo, articulo and lote_articulo.
+        """
+        if not hasattr(self, '_cycles'):
+            self.diagnose_dependencies()
+        return self._cycles
+
+    def _calculate_by_levels(self,
+                             n_levels: int,
+                             cached: Optional[np.ndarray] = None,
+                             checkpoint_path: Optional[str] = None,
+                             lot_hashes: Optional[np.ndarray] = None) -> None:
+        """
+        Rolls up lot costs with one grouped sum per BOM level (private method).
+
+        Parameters
+        ----------
+        n_levels : int
+            Number of BOM levels to roll up.
+        cached : np.ndarray, optional
+            Known cost of every lot (NaN when unknown). Known lots are not recalculated.
+        checkpoint_path : str, optional
+            File where the lot costs are saved after every level. If it holds a
+            checkpoint of the same inputs, the rollup resumes after its last
+            level. The file is removed once every level is done.
+        lot_hashes : np.ndarray, optional
+            Input hash of every lot, as returned by `_lot_input_hashes`;
+            computed here when a checkpoint is kept and it is not given.
+        """
+        # Unit cost of every product lot, indexed by lot code
+        self._lot_costs = np.full(len(self._lots), np.nan)
+        skip = self._blocked_lots.copy()
+        if cached is not None:
+            skip |= ~np.isnan(cached)
+
+        first_level = 0
+        if checkpoint_path is not None:
+            if lot_hashes is None:
+                lot_hashes = self._lot_input_hashes()
+            first_level = self._load_checkpoint(checkpoint_path, lot_hashes)
+
+        for level in range(first_level, n_levels):
+            with self._stage('nivel', nivel=level + 1) as record:
+                resolved = 0
+                if cached is not None:
+                    codes = self.graph.nodes_at_level(level)
+                    codes = codes[~np.isnan(cached[codes])]
+                    self._lot_costs[codes] = cached[codes]
+                    resolved += self._propagate_lot_costs(codes)
+
+                positions = self._level_positions(level)
+                positions = positions[~skip[self._lot_codes[positions]]]
+                totals = self._calculate_level_costs(positions)
+
+                calculables = totals[totals['pendientes'] == 0]['coste']
+                self._log(f"\nNivel {level + 1}:")
+                self._log(f"Productos calculables: {len(calculables)} de {len(totals)}")
+
+                codes = calculables.index.to_numpy()
+                self._lot_costs[codes] = calculables.to_numpy()
+                resolved += self._propagate_lot_costs(codes)
+                record.update(
+                    lotes_calculados=len(calculables),
+                    lotes_pendientes=len(totals) - len(calculables),
+                    registros_resueltos=resolved
+                )
+
+            if checkpoint_path is not None:
+                self._save_checkpoint(checkpoint_path, lot_hashes, level + 1)
+
+        # Blocked lots and lots beyond n_levels stay without cost, and so do the rows consuming them,
+        # whatever cost those rows held before, as with the sparse solver
+        self._propagate_lot_costs(np.flatnonzero(np.isnan(self._lot_costs)))
+
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def _save_checkpoint(self, checkpoint_path: str, lot_hashes: np.ndarray, level: int) -> None:
+        """
+        Saves the lot costs resolved up to `level` as a compressed numpy archive (private method).
+
+        The archive is written to a temporary file and renamed, so a crash
+        while saving never leaves a corrupt checkpoint.
+        """
+        temporary = f"{checkpoint_path}.tmp"
+        with open(temporary, 'wb') as file:
+            np.savez_compressed(file, lot_costs=self._lot_costs, lot_hashes=lot_hashes, level=level)
+        os.replace(temporary, checkpoint_path)
+
+    def _load_checkpoint(self, checkpoint_path: str, lot_hashes: np.ndarray) -> int:
+        """
+        Restores the lot costs of a checkpoint taken on the same inputs (private method).
+
+        Parameters
+        ----------
+        checkpoint_path : str
+            Path of the checkpoint file.
+        lot_hashes : np.ndarray
+            Current input hash of every lot.
+
+        Returns
+        -------
+        int
+            First level still to calculate, 0 if there is no usable checkpoint.
+        """
+        if not os.path.exists(checkpoint_path):
+            return 0
+        with np.load(checkpoint_path) as checkpoint:
+            if not np.array_equal(checkpoint['lot_hashes'], lot_hashes):
+                self._log("ADVERTENCIA: El checkpoint corresponde a otros datos, se calcula desde el principio.")
+                return 0
+            self._lot_costs = checkpoint['lot_costs'].copy()
+            level = int(checkpoint['level'])
+
+        self._propagate_lot_costs(np.flatnonzero(~np.isnan(self._lot_costs)))
+        self._log(f"\nReanudando desde el checkpoint: {level} niveles ya calculados")
+        return level
+
+    def _lot_input_hashes(self) -> np.ndarray:
+        """
+        Hashes the inputs of every lot, including those of its semi-finished components (private method).
+
+        Row hashes cover componente, lote_componente, consumo_unitario and the
+        purchase price; rows consuming a manufactured lot mix in the hash of
+        that lot, so a price change invalidates every lot downstream.
+
+        Returns
+        -------
+        np.ndarray
+            A uint64 hash per lot code (0 for lots that depend on a cycle).
+        """
+        leaf = self._component_lot_codes < 0
+        row_hashes = pd.util.hash_pandas_object(pd.DataFrame({
+            'componente': self.fabricaciones['componente'].to_numpy(),
+            'lote_componente': self.fabricaciones['lote_componente'].to_numpy(),
+            'consumo_unitario': self.fabricaciones['consumo_unitario'].to_numpy(dtype=float),
+            'coste': np.where(leaf, self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float), np.nan)
+        }), index=False).to_numpy()
+
+        lot_hashes = np.zeros(len(self._lots), dtype=np.uint64)
+        for level in range(self.graph.n_levels):
+            positions = self._level_positions(level)
+            hashes = row_hashes[positions]
+            children = self._component_lot_codes[positions]
+            edge = children >= 0
+            hashes[edge] ^= lot_hashes[children[edge]] * np.uint64(0x9E3779B97F4A7C15)
+            np.add.at(lot_hashes, self._lot_codes[positions], hashes)
+        return lot_hashes
+
+    def _load_cost_cache(self, cache_path: str, lot_hashes: np.ndarray) -> np.ndarray:
+        """
+        Reads the lot cost cache and keeps the entries whose inputs are unchanged (private method).
+
+        Parameters
+        ----------
+        cache_path : str
+            Path of the cache file.
+        lot_hashes : np.ndarray
+            Current input hash of every lot.
+
+        Returns
+        -------
+        np.ndarray
+            Cached cost of every lot, NaN for misses and stale entries.
+        """
+        cached = np.full(len(self._lots), np.nan)
+        cache = self._read_cost_cache(cache_path)
+        if cache is None and os.path.exists(cache_path):
+            self._log("ADVERTENCIA: La caché de costes no se puede leer, se calcula sin ella.")
+        elif cache is not None:
+            cache = cache.reindex(self._lots)
+            hits = (cache['hash'].to_numpy() == lot_hashes) & (self.graph.levels >= 0)
+            cached[hits] = cache['coste'].to_numpy()[hits]
+        self._log(f"\nLotes reutilizados de la caché: {np.count_nonzero(~np.isnan(cached))} de {len(self._lots)}")
+        return cached
+
+    def _save_cost_cache(self, cache_path: str, lot_hashes: np.ndarray) -> None:
+        """
+        Writes the calculated lot costs to the cache, evicting stale entries (private method).
+
+        Entries of lots absent from this run are kept for later runs. The
+        cache is written to a temporary file and renamed, so a crash while
+        saving never leaves a corrupt cache.
+
+        Parameters
+        ----------
+        cache_path : str
+            Path of the cache file.
+        lot_hashes : np.ndarray
+            Input hash of every lot.
+        """
+        known = ~np.isnan(self._lot_costs)
+        cache = pd.DataFrame(
+            {'hash': lot_hashes[known], 'coste': self._lot_costs[known]},
+            index=self._lots[known]
+        )
+        previous = self._read_cost_cache(cache_path)
+        if previous is not None:
+            cache = pd.concat([previous[~previous.index.isin(self._lots)], cache])
+        temporary = f"{cache_path}.tmp"
+        cache.to_pickle(temporary)
+        os.replace(temporary, cache_path)
+
+    @staticmethod
+    def _read_cost_cache(cache_path: str) -> Optional[pd.DataFrame]:
+        """
+        Reads the lot cost cache, None if there is none or it cannot be read (private method).
+
+        An unreadable cache is treated as empty and is overwritten by the next save.
+        """
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception:
+            return None
+
+    def _consumption_matrix(self) -> tuple:
+        """
+        Encodes consumption of manufactured lots as a sparse COO matrix (private method).
+
+        Entries are sorted by the BOM level of their product lot, so the slice
+        of each level is contiguous.
+
+        Returns
+        -------
+        tuple
+            (parents, children, consumo, level_indptr): row lot codes, column
+            lot codes, consumo_unitario values and the offsets of each level.
+        """
+        rows = self._rows_by_level[self._level_indptr[1]:]
+        rows = rows[self._component_lot_codes[rows] >= 0]
+        parents = self._lot_codes[rows]
+        consumo = np.nan_to_num(self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[rows])
+        level_indptr = BomGraph.indptr(self.graph.levels[parents], self.graph.n_levels)
+        return parents, self._component_lot_codes[rows], consumo, level_indptr
+
+    def _direct_costs(self) -> np.ndarray:
+        """
+        Returns the cost of the purchased components of every lot (private method).
+
+        Lots with a purchased component without price get NaN.
+        """
+        leaf = np.flatnonzero(self._component_lot_codes < 0)
+        consumo = np.nan_to_num(self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[leaf])
+        coste = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)[leaf]
+        return np.bincount(self._lot_codes[leaf], weights=consumo * coste, minlength=len(self._lots))
+
+    def _back_substitute(self, direct: np.ndarray, n_levels: Optional[int] = None) -> np.ndarray:
+        """
+        Solves costs = direct + A @ costs over the consumption matrix A (private method).
+
+        A is strictly triangular in BOM order, so one sparse product per level
+        solves the system. `direct` may have one column per scenario.
+
+        Parameters
+        ----------
+        direct : np.ndarray
+            Direct cost of every lot, shape (n_lots,) or (n_lots, k).
+        n_levels : int, optional
+            Number of BOM levels to solve, by default all of them.
+
+        Returns
+        -------
+        np.ndarray
+            The total cost of every lot, with the shape of `direct`.
+        """
+        n_levels = self.graph.n_levels if n_levels is None else n_levels
+        parents, children, consumo, level_indptr = self._consumption_matrix()
+        costs = np.array(direct, dtype=float)
+        costs[(self.graph.levels < 0) | (self.graph.levels >= n_levels)] = np.nan
+        weights = consumo.reshape(-1, *[1] * (costs.ndim - 1))
+        for level in range(1, n_levels):
+            level_slice = slice(level_indptr[level], level_indptr[level + 1])
+            np.add.at(costs, parents[level_slice], weights[level_slice] * costs[children[level_slice]])
+        return costs
+
+    def _solve_sparse(self, n_levels: int) -> np.ndarray:
+        """
+        Calculates every lot cost with the sparse consumption matrix (private method).
+
+        Parameters
+        ----------
+        n_levels : int
+            Number of BOM levels to solve.
+
+        Returns
+        -------
+        np.ndarray
+            The unit cost of every lot, indexed by lot code.
+        """
+        return self._back_substitute(self._direct_costs(), n_levels)
+
+    def update_component_costs(self, changes: pd.DataFrame) -> pd.DataFrame:
+        """
+        Applies corrected purchase prices and recalculates only the affected lots.
+
+        The lots consuming the changed component lots are marked as dirty
+        together with every semi-finished and finished lot downstream of them,
+        and only those are recalculated, in BOM order.
+
+        Parameters
+        ----------
+        changes : pd.DataFrame
+            DataFrame with the columns:
+            - componente
+            - lote_componente
+            - coste_componente_unitario
+
+        Returns
+        -------
+        pd.DataFrame
+            Manufacturing costs of the affected orders, with the same columns
+            as `generate_manufacturing_costs`.
+        """
+        if not hasattr(self, '_lot_costs'):
+            raise ValueError("Debes ejecutar calculate_costs_recursively antes de actualizar costes.")
+
+        prices = pd.Series(
+            changes['coste_componente_unitario'].to_numpy(dtype=float),
+            index=self._encode_lot(changes['componente'], changes['lote_componente'])
+        )
+        prices = prices[~prices.index.duplicated(keep='last') & (prices.index >= 0)]
+
+        with self._stage('actualizacion') as record:
+            # Purchased rows holding a changed component lot
+            positions = np.flatnonzero(
+                np.isin(self._component_keys, prices.index.to_numpy()) & (self._component_lot_codes < 0)
+            )
+            column = self.fabricaciones.columns.get_loc('coste_componente_unitario')
+            self.fabricaciones.iloc[positions, column] = prices.reindex(self._component_keys[positions]).to_numpy()
+
+            # Dirty lots: direct consumers and all their ancestors
+            dirty, affected = self._recalculate_lots(self._lot_codes[positions])
+            record.update(registros_corregidos=len(positions), lotes_recalculados=len(dirty))
+        self.fabricaciones['flag_coste_calculado'] = self.fabricaciones['coste_componente_unitario'].notna()
+
+        self._log("\nActualización incremental:")
+        self._log(f"Registros con precio corregido: {len(positions)}")
+        self._log(f"Lotes recalculados: {len(dirty)}")
+
+        self._record_rollup()
+        orders = np.unique(self._order_codes[affected])
+        return self._order_costs(orders[orders >= 0])
+
+    def _recalculate_lots(self, seeds: np.ndarray, rows: np.ndarray = None) -> tuple:
+        """
+        Recalculates `seeds` and every lot downstream of them, in BOM order (private method).
+
+        The cost of every dirty lot is cleared first, so lots that end up on a
+        cycle (level -1) stay without cost, as in a full calculation.
+
+        Parameters
+        ----------
+        seeds : np.ndarray
+            Codes of the lots whose inputs changed.
+        rows : np.ndarray, optional
+            Positions of rows that point to a component lot for the first time.
+            They take its cost, or NaN when that lot is dirty.
+
+        Returns
+        -------
+        tuple
+            (dirty, affected): codes of the recalculated lots and positions of their rows.
+        """
+        dirty = self.graph.ancestors(seeds)
+        self._lot_costs[dirty] = np.nan
+        self._propagate_lot_costs(dirty)
+        if rows is not None:
+            column = self.fabricaciones.columns.get_loc('coste_componente_unitario')
+            self.fabricaciones.iloc[rows, column] = self._lot_costs[self._component_lot_codes[rows]]
+
+        solvable = dirty[self.graph.levels[dirty] >= 0]
+        solvable = solvable[np.argsort(self.graph.levels[solvable], kind='stable')]
+        solvable_levels = self.graph.levels[solvable]
+
+        for level in np.unique(solvable_levels):
+            codes = solvable[solvable_levels == level]
+            totals = self._calculate_level_costs(
+                BomGraph.gather(self._lot_indptr, self._rows_by_lot, codes)
+            )
+            calculables = totals[totals['pendientes'] == 0]['coste']
+            self._lot_costs[calculables.index.to_numpy()] = calculables.to_numpy()
+            self._propagate_lot_costs(codes)
+
+        return dirty, BomGraph.gather(self._lot_indptr, self._rows_by_lot, dirty)
+
+    def append(self, new_fabricaciones: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adds new fabrication rows and costs only what they change.
+
+        The new rows are encoded into the existing article and lot code
+        spaces, which only grow with unseen labels, and merged into the lot,
+        where-used, order and level indexes and the BOM graph; the history is
+        never re-encoded or re-sorted. The resolved lot costs are kept. Only
+        the lots of the new rows, the lots whose semi-finished component lot
+        changed (for instance a SEM lot that is manufactured for the first
+        time), the lots still without cost and everything downstream of them
+        are recalculated.
+
+        The frame and the flat index arrays are still copied once to make
+        room for the new entries, so an append takes a time linear in the
+        history, but of memory copies only.
+
+        Parameters
+        ----------
+        new_fabricaciones : pd.DataFrame
+            New fabrication rows, with the same columns as the initial frame.
+
+        Returns
+        -------
+        pd.DataFrame
+            Manufacturing costs of the new and affected orders, with the same
+            columns as `generate_manufacturing_costs`.
+        """
+        if not hasattr(self, '_lot_costs'):
+            raise ValueError("Debes ejecutar calculate_costs_recursively antes de añadir fabricaciones.")
+
+        with self._stage('ingesta', registros_nuevos=len(new_fabricaciones)) as record:
+            n_old = len(self.fabricaciones)
+            n_old_lots = len(self._lots)
+
+            new_fabricaciones = new_fabricaciones.copy()
+            new_fabricaciones['flag_coste_calculado'] = ~new_fabricaciones['componente'].str.startswith('SEM')
+            self.fabricaciones = pd.concat([self.fabricaciones, new_fabricaciones], ignore_index=True)
+            changed = self._extend_graph(n_old)
+            self._lot_costs = np.concatenate([self._lot_costs, np.full(len(self._lots) - n_old_lots, np.nan)])
+
+            # Rows pointing to a lot for the first time take its cost once the dirty lots are cleared
+            rows = np.concatenate([changed, np.arange(n_old, len(self.fabricaciones))])
+            rows = rows[self._component_lot_codes[rows] >= 0]
+
+            dirty, affected = self._recalculate_lots(np.concatenate([
+                self._lot_codes[n_old:],
+                self._lot_codes[changed],
+                np.flatnonzero(np.isnan(self._lot_costs))
+            ]), rows)
+            self.fabricaciones['flag_coste_calculado'] = self.fabricaciones['coste_componente_unitario'].notna()
+            self._record_rollup()
+            record.update(lotes_nuevos=len(self._lots) - n_old_lots, lotes_recalculados=len(dirty))
+
+        self._log("\nIngesta incremental:")
+        self._log(f"Registros añadidos: {len(new_fabricaciones)}")
+        self._log(f"Lotes recalculados: {len(dirty)} de {len(self._lots)}")
+
+        orders = np.union1d(self._order_codes[n_old:], self._order_codes[affected])
+        return self._order_costs(orders[orders >= 0])
+
+    def _extend_graph(self, n_old: int) -> np.ndarray:
+        """
+        Encodes the rows from position `n_old` on and adds them to the graph and the row indexes (private method).
+
+        New lots take the next lot codes. Earlier rows whose lot was not
+        manufactured are matched again when their article gets new lots or
+        an earlier lot date, either to the exact lot or to a new fallback lot.
+
+        Parameters
+        ----------
+        n_old : int
+            Number of rows already indexed.
+
+        Returns
+        -------
+        np.ndarray
+            Positions of the earlier rows whose component lot changed.
+        """
+        new = self.fabricaciones.iloc[n_old:]
+        n_new = len(new)
+        self._items, item_codes = self._extend_code_space(
+            self._items, pd.concat([new['articulo'], new['componente']], ignore_index=True)
+        )
+        self._lotes, lote_codes = self._extend_code_space(
+            self._lotes, pd.concat([new['lote_articulo'], new['lote_componente']], ignore_index=True)
+        )
+        articulo_codes, componente_codes = item_codes[:n_new], item_codes[n_new:]
+        self._articulo_codes = np.concatenate([self._articulo_codes, articulo_codes])
+        self._componente_codes = np.concatenate([self._componente_codes, componente_codes])
+        self._lote_articulo_codes = np.concatenate([self._lote_articulo_codes, lote_codes[:n_new]])
+        self._lote_componente_codes = np.concatenate([self._lote_componente_codes, lote_codes[n_new:]])
+
+        # New lots take the next codes
+        n_old_lots = len(self._lot_index)
+        lot_keys = self._lot_keys(articulo_codes, lote_codes[:n_new])
+        unique_keys = np.unique(lot_keys)
+        self._lot_index = self._lot_index.append(pd.Index(unique_keys[self._lot_index.get_indexer(unique_keys) < 0]))
+        self._lots = self._lot_labels(self._lot_index.to_numpy())
+        lot_codes = self._lot_index.get_indexer(lot_keys)
+        # Lot dates: new lots, and old lots the new rows manufacture earlier
+        fechas = self.fabricaciones['fecha_fabricacion'].to_numpy().astype('datetime64[D]')
+        old_dates = self._lot_dates
+        self._lot_dates = np.concatenate([
+            old_dates, np.full(len(self._lots) - n_old_lots, np.datetime64('NaT'), dtype='datetime64[D]')
+        ])
+        np.fmin.at(self._lot_dates, lot_codes, fechas[n_old:])
+        redated = np.flatnonzero(self._lot_dates[:n_old_lots] != old_dates)
+        touched_lots = np.concatenate([np.arange(n_old_lots, len(self._lot_index)), redated])
+        touched = np.zeros(len(self._items), dtype=bool)
+        touched[self._lot_index.to_numpy()[touched_lots] // self._LOT_KEY_STRIDE] = True
+
+        # Component lots of the new rows, with the same fallback as in _build_graph
+        component_keys = self._lot_keys(componente_codes, lote_codes[n_new:])
+        component_lot_codes = self._lot_index.get_indexer(component_keys)
+        unmatched = np.flatnonzero((component_lot_codes < 0) & (componente_codes >= 0))
+        component_lot_codes[unmatched] = self._fallback_lots(componente_codes[unmatched], fechas[n_old:][unmatched])
+        substituted = np.zeros(n_new, dtype=bool)
+        substituted[unmatched] = component_lot_codes[unmatched] >= 0
+
+        # Earlier rows consuming an article with new or redated lots are matched again
+        old_components = self._componente_codes[:n_old]
+        rematched = np.flatnonzero((old_components >= 0) & touched[np.maximum(old_components, 0)])
+        rematched_codes = self._lot_index.get_indexer(self._component_keys[rematched])
+        unmatched = np.flatnonzero(rematched_codes < 0)
+        rematched_codes[unmatched] = self._fallback_lots(
+            old_components[rematched[unmatched]], fechas[rematched[unmatched]]
+        )
+        flags = np.concatenate([self.fabricaciones['flag_lote_sustituido'].to_numpy(dtype=bool)[:n_old], substituted])
+        flags[rematched] = False
+        flags[rematched[unmatched]] = rematched_codes[unmatched] >= 0
+        self.fabricaciones['flag_lote_sustituido'] = flags
+        moved = rematched_codes != self._component_lot_codes[rematched]
+        changed = rematched[moved]
+        old_children, new_children = self._component_lot_codes[changed], rematched_codes[moved]
+
+        self._component_keys = np.concatenate([self._component_keys, component_keys])
+        self._lot_codes = np.concatenate([self._lot_codes, lot_codes])
+        self._component_lot_codes = np.concatenate([self._component_lot_codes, component_lot_codes])
+        self._component_lot_codes[changed] = new_children
+        new_rows = np.arange(n_old, n_old + n_new)
+        consuming = new_rows[component_lot_codes >= 0]
+
+        # Lot index
+        self._lot_indptr, self._rows_by_lot = BomGraph.insert(
+            self._lot_indptr, self._rows_by_lot, lot_codes, new_rows, len(self._lots)
+        )
+
+        # Where-used index: changed rows move to their new lot
+        was_manufactured = old_children >= 0
+        self._where_used_indptr, self._where_used_rows = BomGraph.remove(
+            self._where_used_indptr, self._where_used_rows, old_children[was_manufactured], changed[was_manufactured]
+        )
+        self._where_used_indptr, self._where_used_rows = BomGraph.insert(
+            self._where_used_indptr, self._where_used_rows,
+            np.concatenate([new_children, self._component_lot_codes[consuming]]),
+            np.concatenate([changed, consuming]),
+            len(self._lots)
+        )
+
+        # Graph: edges of the new rows and of the changed rows; old edges go when no row keeps them
+        parents = self._lot_codes[changed[was_manufactured]]
+        old_edges = np.unique(parents * self._LOT_KEY_STRIDE + old_children[was_manufactured])
+        rows = BomGraph.gather(self._lot_indptr, self._rows_by_lot, np.unique(parents))
+        kept = self._lot_codes[rows].astype(np.int64) * self._LOT_KEY_STRIDE + self._component_lot_codes[rows]
+        removed_parents, removed_children = np.divmod(old_edges[~np.isin(old_edges, kept)], self._LOT_KEY_STRIDE)
+
+        old_levels = self.graph.levels.copy()
+        self.graph.extend(
+            len(self._lots),
+            np.concatenate([self._lot_codes[changed], self._lot_codes[consuming]]),
+            np.concatenate([new_children, self._component_lot_codes[consuming]]),
+            removed_parents,
+            removed_children
+        )
+
+        # Level index: rows of the lots whose level changed move to their new level
+        relevelled = np.flatnonzero(self.graph.levels[:n_old_lots] != old_levels)
+        relevelled_rows = BomGraph.gather(self._lot_indptr, self._rows_by_lot, relevelled)
+        relevelled_rows = relevelled_rows[relevelled_rows < n_old]
+        self._level_indptr, self._rows_by_level = BomGraph.remove(
+            self._level_indptr, self._rows_by_level,
+            old_levels[self._lot_codes[relevelled_rows]] + 1, relevelled_rows
+        )
+        rows = np.concatenate([relevelled_rows, new_rows])
+        self._level_indptr, self._rows_by_level = BomGraph.insert(
+            self._level_indptr, self._rows_by_level,
+            self.graph.levels[self._lot_codes[rows]] + 1, rows,
+            max(len(self._level_indptr) - 1, self.graph.n_levels + 1)
+        )
+        self._level_indptr = self._level_indptr[:self.graph.n_levels + 2]
+
+        self._extend_orders(n_old)
+        return changed
+
+    @staticmethod
+    def _extend_code_space(index: pd.Index, labels: pd.Series) -> tuple:
+        """
+        Encodes `labels` into a code space, appending the labels it does not hold yet (private method).
+
+        Returns
+        -------
+        tuple
+            (index, codes): the grown code space and the int32 code of every label (-1 for missing values).
+        """
+        codes = index.get_indexer(labels)
+        unseen = (codes < 0) & labels.notna().to_numpy()
+        if unseen.any():
+            index = index.append(pd.Index(pd.unique(labels[unseen])))
+            codes[unseen] = index.get_indexer(labels[unseen])
+        return index, codes.astype(np.int32)
+
+    def _extend_orders(self, n_old: int) -> None:
+        """
+        Adds the orders of the rows from position `n_old` on to the order index (private method).
+
+        New orders are inserted at their (fecha_fabricacion, id_orden) rank,
+        so order codes keep following the date order.
+        """
+        new = self.fabricaciones.iloc[n_old:]
+        label_codes, labels = pd.factorize(new['id_orden'])
+        existing = self._orders.get_indexer(labels)
+        fresh = np.flatnonzero(existing < 0)
+
+        fechas = self.fabricaciones['fecha_fabricacion'].to_numpy()
+        ordered = np.flatnonzero(label_codes >= 0)
+        dates = fechas[n_old:][ordered[np.unique(label_codes[ordered], return_index=True)[1]]][fresh]
+        ids = np.asarray(labels, dtype=object)[fresh]
+        by_date = np.lexsort((ids, dates))
+        fresh, dates, ids = fresh[by_date], dates[by_date], ids[by_date]
+
+        # Rank among the existing orders, comparing id_orden on date ties
+        old_dates = fechas[self._rows_by_order[self._order_indptr[:-1]]]
+        old_ids = np.asarray(self._orders, dtype=object)
+        positions = np.searchsorted(old_dates, dates, side='left')
+        ends = np.searchsorted(old_dates, dates, side='right')
+        for tie in np.flatnonzero(ends > positions):
+            positions[tie] += np.searchsorted(old_ids[positions[tie]:ends[tie]], ids[tie])
+
+        n_orders = len(self._orders)
+        remap = np.arange(n_orders) + np.searchsorted(positions, np.arange(n_orders), side='right')
+        codes = np.empty(len(labels), dtype=np.int64)
+        codes[existing >= 0] = remap[existing[existing >= 0]]
+        codes[fresh] = positions + np.arange(len(fresh))
+
+        if len(fresh) and positions[0] < n_orders:
+            self._order_codes = np.where(self._order_codes >= 0, remap[self._order_codes], -1)
+        counts = np.zeros(n_orders + len(fresh), dtype=np.int64)
+        counts[remap] = np.diff(self._order_indptr)
+        self._order_indptr = np.concatenate([[0], np.cumsum(counts)])
+        self._orders = pd.Index(np.insert(old_ids, positions, ids))
+
+        new_codes = np.full(len(label_codes), -1, dtype=np.int64)
+        new_codes[ordered] = codes[label_codes[ordered]]
+        self._order_codes = np.concatenate([self._order_codes, new_codes])
+        self._order_indptr, self._rows_by_order = BomGraph.insert(
+            self._order_indptr, self._rows_by_order, new_codes[ordered], n_old + ordered
+        )
+
+    def save_state(self, path: str) -> None:
+        """
+        Persists the calculator (fabrications, graph, indexes and resolved lot costs) to `path`.
+
+        Callbacks are not persisted.
+
+        Parameters
+        ----------
+        path : str
+            Path of the state file (pickle).
+        """
+        pd.to_pickle(self, path)
+
+    @classmethod
+    def load_state(cls,
+                   path: str,
+                   verbose: bool = True,
+                   callbacks: Optional[List[Callable[[Dict], None]]] = None) -> 'CostCalculator':
+        """
+        Restores a calculator persisted with `save_state`.
+
+        Parameters
+        ----------
+        path : str
+            Path of the state file.
+        verbose : bool, default True
+            If False, nothing is printed to the console.
+        callbacks : list of callables, optional
+            Functions called with every progress record.
+
+        Returns
+        -------
+        CostCalculator
+            The restored calculator, ready for `append`.
+        """
+        calculator = pd.read_pickle(path)
+        if not isinstance(calculator, cls):
+            raise ValueError(f"El fichero {path} no contiene un estado de CostCalculator.")
+        calculator.verbose = verbose
+        calculator._callbacks = list(callbacks or [])
+        return calculator
+
+    def __getstate__(self) -> dict:
+        """
+        Drops the callbacks and progress records when pickling (private method).
+        """
+        state = self.__dict__.copy()
+        state['_callbacks'] = []
+        state['_events'] = []
+        return state
+
+    def _record_rollup(self) -> None:
+        """
+        Records the row costs and consumptions of the last rollup as flat arrays (private method).
+
+        Together with the lot and where-used indexes they form the parent/child
+        representation read by `explain`. Requirement coefficients derived
+        from a previous rollup are discarded.
+        """
+        self._row_costs = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float, copy=True)
+        self._row_consumos = self.fabricaciones['consumo_unitario'].to_numpy(dtype=float, copy=True)
+        self._requirements = None
+
+    def explain(self, id_orden: str) -> pd.DataFrame:
+        """
+        Breaks down the cost of an order into every component lot, at every BOM level.
+
+        The tree is expanded on demand from the arrays recorded by the last
+        rollup; nothing is recalculated.
+
+        Parameters
+        ----------
+        id_orden : str
+            The manufacturing order to explain.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per node of the tree, parents before their children, with the columns:
+            - nivel: depth in the tree (1 = direct component of the order)
+            - padre: row of the parent node in this DataFrame (-1 for direct components)
+            - componente
+            - lote_componente
+            - consumo_unitario: consumption per unit of the parent
+            - consumo_acumulado: consumption per unit of the order's product
+            - coste_componente_unitario
+            - coste_aportado: consumo_acumulado * coste_componente_unitario
+            - cuota: share of coste_aportado in the order cost
+        """
+        if not hasattr(self, '_row_costs'):
+            raise ValueError("Debes ejecutar calculate_costs_recursively antes de explicar una orden.")
+        order = self._orders.get_indexer([id_orden])[0]
+        if order < 0:
+            raise ValueError(f"Orden desconocida: {id_orden}")
+
+        order_rows = self._rows_by_order[self._order_indptr[order]:self._order_indptr[order + 1]]
+        total = np.nansum(self._row_consumos[order_rows] * self._row_costs[order_rows])
+
+        nodes, depths, parents, factors = [], [], [], []
+        stack = [(row, 1, -1, 1.0) for row in order_rows[::-1]]
+        while stack:
+            row, depth, parent, factor = stack.pop()
+            accumulated = factor * self._row_consumos[row]
+            position = len(nodes)
+            nodes.append(row)
+            depths.append(depth)
+            parents.append(parent)
+            factors.append(accumulated)
+
+            # Expand manufactured lots; lots on a cycle are left as leaves
+            child = self._component_lot_codes[row]
+            if child >= 0 and self.graph.levels[child] >= 0:
+                child_rows = self._rows_by_lot[self._lot_indptr[child]:self._lot_indptr[child + 1]]
+                stack.extend((sub, depth + 1, position, accumulated) for sub in child_rows[::-1])
+
+        nodes = np.array(nodes, dtype=np.int64)
+        factors = np.array(factors)
+        contributions = factors * self._row_costs[nodes]
+        return pd.DataFrame({
+            'nivel': depths,
+            'padre': parents,
+            'componente': self._items.take(self._componente_codes[nodes], allow_fill=True),
+            'lote_componente': self._lotes.take(self._lote_componente_codes[nodes], allow_fill=True),
+            'consumo_unitario': self._row_consumos[nodes],
+            'consumo_acumulado': factors,
+            'coste_componente_unitario': self._row_costs[nodes],
+            'coste_aportado': contributions,
+            'cuota': contributions / total if total else np.nan
+        })
+
+    def requirement_coefficients(self) -> pd.DataFrame:
+        """
+        Returns the total requirement of every purchased component in every product lot.
+
+        The coefficients of all lots are computed in one pass over the BOM
+        levels: a lot inherits the coefficients of the semi-finished lots it
+        consumes, scaled by their consumption. The result is a sparse table
+        (one row per non-zero entry) and is kept until the next rollup, so
+        `component_impact` answers from it without recalculating.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per (product lot, purchased component) with the columns:
+            - articulo
+            - lote_articulo
+            - componente
+            - cantidad: units of the component per unit of the lot, at every depth
+            - coste_aportado: cost those units add to the unit cost of the lot
+        """
+        if not hasattr(self, '_row_costs'):
+            raise ValueError("Debes ejecutar calculate_costs_recursively antes de calcular coeficientes.")
+        if self._requirements is None:
+            self._requirements = self._requirement_matrix()
+
+        lots, components, cantidad, coste = self._requirements['coo']
+        lot_keys = self._lots[lots]
+        return pd.DataFrame({
+            'articulo': lot_keys.get_level_values('articulo'),
+            'lote_articulo': lot_keys.get_level_values('lote_articulo'),
+            'componente': self._items[components],
+            'cantidad': cantidad,
+            'coste_aportado': coste
+        })
+
+    def component_impact(self, componente: str, variacion: float = 0.01) -> pd.DataFrame:
+        """
+        Returns how much the unit cost of every lot moves if a component price changes.
+
+        Parameters
+        ----------
+        componente : str
+            The purchased component.
+        variacion : float, default 0.01
+            Relative price change (0.01 = +1%).
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per lot that consumes the component, directly or through
+            semi-finished lots, with the columns articulo, lote_articulo,
+            cantidad, coste_unitario, impacto (change of the unit cost) and
+            impacto_relativo (impacto / coste_unitario).
+        """
+        if not hasattr(self, '_row_costs'):
+            raise ValueError("Debes ejecutar calculate_costs_recursively antes de calcular impactos.")
+        if self._requirements is None:
+            self._requirements = self._requirement_matrix()
+
+        lots, _, cantidad, coste = self._requirements['coo']
+        code = self._items.get_indexer([componente])
+        entries = BomGraph.gather(self._requirements['indptr'], self._requirements['by_component'], code)
+        lot_keys = self._lots[lots[entries]]
+        coste_unitario = self._lot_costs[lots[entries]]
+        impacto = variacion * coste[entries]
+        return pd.DataFrame({
+            'articulo': lot_keys.get_level_values('articulo'),
+            'lote_articulo': lot_keys.get_level_values('lote_articulo'),
+            'cantidad': cantidad[entries],
+            'coste_unitario': coste_unitario,
+            'impacto': impacto,
+            'impacto_relativo': impacto / coste_unitario
+        })
+
+    def _requirement_matrix(self) -> dict:
+        """
+        Builds the sparse lot x purchased component requirement matrix level by level (private method).
+
+        Returns
+        -------
+        dict
+            - coo: (lots, components, cantidad, coste) arrays sorted by lot and component
+            - by_component, indptr: CSR index component -> entries of the COO arrays
+        """
+        n_items = len(self._items)
+        levels = self.graph.levels
+        leaf = np.flatnonzero(self._component_lot_codes < 0)
+        edges = np.flatnonzero(self._component_lot_codes >= 0)
+        leaf_levels = levels[self._lot_codes[leaf]]
+        edge_levels = levels[self._lot_codes[edges]]
+        child_levels = levels[self._component_lot_codes[edges]]
+
+        solved = []
+        for level in range(self.graph.n_levels):
+            rows = leaf[leaf_levels == level]
+            lots = [self._lot_codes[rows]]
+            components = [self._componente_codes[rows]]
+            cantidad = [self._row_consumos[rows]]
+            coste = [self._row_consumos[rows] * self._row_costs[rows]]
+
+            # Semi-finished components bring their own coefficients, scaled by consumption
+            for child_level, (indptr, child_components, child_cantidad, child_coste) in enumerate(solved):
+                rows = edges[(edge_levels == level) & (child_levels == child_level)]
+                children = self._component_lot_codes[rows]
+                lengths = indptr[children + 1] - indptr[children]
+                entries = BomGraph.gather(indptr, np.arange(len(child_components)), children)
+                factors = np.repeat(self._row_consumos[rows], lengths)
+                lots.append(np.repeat(self._lot_codes[rows], lengths))
+                components.append(child_components[entries])
+                cantidad.append(factors * child_cantidad[entries])
+                coste.append(factors * child_coste[entries])
+
+            keys, inverse = np.unique(
+                np.concatenate(lots).astype(np.int64) * n_items + np.concatenate(components),
+                return_inverse=True
+            )
+            level_lots, level_components = np.divmod(keys, n_items)
+            solved.append((
+                BomGraph.indptr(level_lots, len(self._lots)),
+                level_components,
+                np.bincount(inverse, weights=np.concatenate(cantidad), minlength=len(keys)),
+                np.bincount(inverse, weights=np.concatenate(coste), minlength=len(keys))
+            ))
+
+        lots = np.concatenate([np.repeat(np.arange(len(self._lots)), np.diff(indptr)) for indptr, *_ in solved])
+        components = np.concatenate([entry[1] for entry in solved])
+        order = np.lexsort((components, lots))
+        coo = (
+            lots[order],
+            components[order],
+            np.concatenate([entry[2] for entry in solved])[order],
+            np.concatenate([entry[3] for entry in solved])[order]
+        )
+        by_component = np.argsort(coo[1], kind='stable')
+        return {'coo': coo, 'by_component': by_component, 'indptr': BomGraph.indptr(coo[1], n_items)}
+
+    def simulate_prices(self, scenarios: pd.DataFrame) -> pd.DataFrame:
+        """
+        Evaluates several price scenarios for purchased components at once.
+
+        All scenarios share the BOM structure and are rolled up together as
+        one column each, so N scenarios cost one pass instead of N full runs.
+
+        Parameters
+        ----------
+        scenarios : pd.DataFrame
+            DataFrame indexed by componente with one column per scenario. Each
+            value multiplies the current unit price of that component (1.08 =
+            +8%). Components not listed keep their price.
+
+        Returns
+        -------
+        pd.DataFrame
+            Manufacturing cost of every order (index id_orden) under every
+            scenario (one column per scenario).
+        """
+        leaf = np.flatnonzero(self._component_lot_codes < 0)
+        factors = scenarios.reindex(self._items).fillna(1.0).to_numpy(dtype=float)
+        factors = np.vstack([factors, np.ones(factors.shape[1])])[self._componente_codes[leaf]]
+        consumo = np.nan_to_num(self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[leaf])
+        coste = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)[leaf]
+
+        _, order_costs = self._rollup_scenarios(leaf, (consumo * coste)[:, None] * factors)
+
+        self._log("\nSimulación de precios:")
+        self._log(f"Escenarios simulados: {factors.shape[1]}")
+        self._log(f"Órdenes evaluadas: {len(self._orders)}")
+
+        return pd.DataFrame(
+            order_costs,
+            index=pd.Index(self._orders, name='id_orden'),
+            columns=scenarios.columns
+        )
+
+    def calculate_cost_by_category(self, category_column: str = 'familia') -> pd.DataFrame:
+        """
+        Splits the unit cost of every product lot by the category of its purchased components.
+
+        Each purchased row contributes to one column of a cost vector (its
+        category, for instance MATERIA PRIMA or MATERIAL AUXILIAR), and the
+        vectors are rolled up through the BOM in a single 2-D pass, so the cost
+        of semi-finished components reaches their consumers already split.
+
+        Parameters
+        ----------
+        category_column : str, default 'familia'
+            Column with the category of each component (Familia).
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per product lot with the columns articulo, lote_articulo,
+            one column per category, coste_total and coste_semielaborados (part
+            of coste_total that enters through semi-finished components, already
+            included in the category columns).
+        """
+        if category_column not in self.fabricaciones.columns:
+            raise ValueError(
+                f"Falta la columna de categoría '{category_column}' en fabricaciones. Los datos limpios "
+                f"generados antes de conservar Familia no la incluyen: vuelve a limpiarlos con "
+                f"Parameters.fabricaciones o indica otra columna en category_column."
+            )
+
+        leaf = np.flatnonzero(self._component_lot_codes < 0)
+        categories = self.fabricaciones[category_column].to_numpy(dtype=object)[leaf]
+        category_codes, category_names = pd.factorize(
+            pd.Series(categories).fillna('SIN CATEGORIA'), sort=True
+        )
+        consumo = np.nan_to_num(self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[leaf])
+        coste = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)[leaf]
+
+        contributions = np.zeros((len(leaf), len(category_names)))
+        contributions[np.arange(len(leaf)), category_codes] = consumo * coste
+        lot_costs, _ = self._rollup_scenarios(leaf, contributions)
+        total = lot_costs.sum(axis=1)
+
+        edges = np.flatnonzero(self._component_lot_codes >= 0)
+        semis = np.bincount(
+            self._lot_codes[edges],
+            weights=np.nan_to_num(self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[edges])
+            * total[self._component_lot_codes[edges]],
+            minlength=len(self._lots)
+        )
+
+        desglose = pd.DataFrame(lot_costs, columns=category_names)
+        desglose.insert(0, 'articulo', self._lots.get_level_values('articulo'))
+        desglose.insert(1, 'lote_articulo', self._lots.get_level_values('lote_articulo'))
+        desglose['coste_total'] = total
+        desglose['coste_semielaborados'] = np.where(np.isnan(total), np.nan, semis)
+
+        self._log("\nDesglose por categoría:")
+        self._log(f"Categorías: {', '.join(category_names)}")
+        self._log(f"Lotes desglosados: {np.count_nonzero(~np.isnan(total))} de {len(self._lots)}")
+
+        return desglose
+
+    def simulate_cost_distribution(self,
+                                   precios: pd.DataFrame,
+                                   n_samples: int = 1000,
+                                   percentiles: tuple = (5, 50, 95),
+                                   batch_size: int = 250,
+                                   seed: Optional[int] = None) -> pd.DataFrame:
+        """
+        Estimates the distribution of the unit cost of every article by Monte Carlo.
+
+        Each sample draws one price per purchased component from its observed
+        prices in `precios` and every row of that component uses it. Samples
+        are rolled up through the BOM as the columns of one 2-D array, in
+        batches of `batch_size` to bound memory. Components without observed
+        prices keep their current price.
+
+        Parameters
+        ----------
+        precios : pd.DataFrame
+            Observed purchase prices with the columns componente and
+            coste_componente_unitario, for instance costes.
+        n_samples : int, default 1000
+            Number of samples.
+        percentiles : tuple, default (5, 50, 95)
+            Percentiles of the unit cost to report.
+        batch_size : int, default 250
+            Samples rolled up together. It does not change the result for a given seed.
+        seed : int, optional
+            Seed of the random generator.
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame indexed by articulo with the columns media and one
+            column p<q> per percentile, computed over the samples of the mean
+            unit cost of the article's orders.
+        """
+        rng = np.random.default_rng(seed)
+        precios = precios.dropna(subset=['componente', 'coste_componente_unitario'])
+        price_codes = self._items.get_indexer(precios['componente'])
+        observed = price_codes >= 0
+        order = np.argsort(price_codes[observed], kind='stable')
+        observed_prices = precios['coste_componente_unitario'].to_numpy(dtype=float)[observed][order]
+        price_indptr = BomGraph.indptr(price_codes[observed][order], len(self._items))
+        counts = np.diff(price_indptr)
+
+        leaf = np.flatnonzero(self._component_lot_codes < 0)
+        leaf_codes = self._componente_codes[leaf]
+        consumo = np.nan_to_num(self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[leaf])
+        coste = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)[leaf]
+        sampled = (leaf_codes >= 0) & (counts[np.maximum(leaf_codes, 0)] > 0)
+
+        article_codes = self._articulo_codes[self._rows_by_order[self._order_indptr[:-1]]]
+        orders_per_article = np.bincount(article_codes, minlength=len(self._items))
+        article_costs = np.empty((len(self._items), n_samples))
+
+        with self._stage('montecarlo', muestras=n_samples) as record:
+            for start in range(0, n_samples, batch_size):
+                k = min(batch_size, n_samples - start)
+                # Drawn sample by sample, so a seed gives the same samples whatever the batch size
+                uniform = rng.random((k, len(self._items))).T
+                draws = price_indptr[:-1, None] + (uniform * counts[:, None]).astype(np.int64)
+                prices = np.repeat(coste[:, None], k, axis=1)
+                prices[sampled] = observed_prices[draws[leaf_codes[sampled]]]
+
+                _, order_costs = self._rollup_scenarios(leaf, consumo[:, None] * prices)
+                totals = np.zeros((len(self._items), k))
+                np.add.at(totals, article_codes, order_costs)
+                article_costs[:, start:start + k] = totals
+
+            articles = np.flatnonzero(orders_per_article)
+            article_costs = article_costs[articles] / orders_per_article[articles, None]
+            record.update(articulos=len(articles), componentes_muestreados=int(np.count_nonzero(counts)))
+
+        self._log("\nSimulación Monte Carlo:")
+        self._log(f"Muestras: {n_samples}")
+        self._log(f"Componentes con precios observados: {np.count_nonzero(counts)}")
+
+        distribution = pd.DataFrame(
+            np.percentile(article_costs, percentiles, axis=1).T,
+            index=pd.Index(self._items[articles], name='articulo'),
+            columns=[f'p{q}' for q in percentiles]
+        )
+        distribution.insert(0, 'media', article_costs.mean(axis=1))
+        return distribution
+
+    def _rollup_scenarios(self, leaf: np.ndarray, contributions: np.ndarray) -> tuple:
+        """
+        Rolls up purchased component costs with one column per scenario (private method).
+
+        Parameters
+        ----------
+        leaf : np.ndarray
+            Row positions of the purchased components.
+        contributions : np.ndarray
+            consumo_unitario * price of each row in `leaf`, shape (len(leaf), k).
+
+        Returns
+        -------
+        tuple
+            (lot_costs, order_costs): arrays of shape (n_lots, k) and
+            (n_orders, k). Order costs skip missing values, as
+            `generate_manufacturing_costs` does.
+        """
+        n_scenarios = contributions.shape[1]
+        direct = np.zeros((len(self._lots), n_scenarios))
+        np.add.at(direct, self._lot_codes[leaf], contributions)
+        lot_costs = self._back_substitute(direct)
+
+        edges = np.flatnonzero(self._component_lot_codes >= 0)
+        consumo = np.nan_to_num(self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[edges])
+        order_costs = np.zeros((len(self._orders), n_scenarios))
+        ordered = self._order_codes[leaf] >= 0
+        np.add.at(order_costs, self._order_codes[leaf][ordered], np.nan_to_num(contributions[ordered]))
+        ordered = self._order_codes[edges] >= 0
+        np.add.at(
+            order_costs,
+            self._order_codes[edges][ordered],
+            np.nan_to_num(consumo[ordered, None] * lot_costs[self._component_lot_codes[edges][ordered]])
+        )
+        return lot_costs, order_costs
+
+    def _level_positions(self, level: int) -> np.ndarray:
+        """
+        Returns the row positions of the products at BOM `level` (private method).
+
+        Level -1 holds the rows of products that depend on a cycle.
+        """
+        if level >= self.graph.n_levels:
+            return self._rows_by_level[:0]
+        return self._rows_by_level[self._level_indptr[level + 1]:self._level_indptr[level + 2]]
+
+    def _propagate_lot_costs(self, codes: np.ndarray) -> int:
+        """
+        Writes the cost of calculated lots into the rows that consume them (private method).
+
+        Parameters
+        ----------
+        codes : np.ndarray
+            Codes of the lots whose cost was just calculated.
+
+        Returns
+        -------
+        int
+            Number of rows updated.
+        """
+        positions = BomGraph.gather(self._where_used_indptr, self._where_used_rows, codes)
+        column = self.fabricaciones.columns.get_loc('coste_componente_unitario')
+        self.fabricaciones.iloc[positions, column] = self._lot_costs[self._component_lot_codes[positions]]
+        return len(positions)
+
+    def _calculate_level_costs(self, positions: np.ndarray) -> pd.DataFrame:
+        """
+        Calculates the unit cost of every product lot with one grouped sum (private method).
+
+        Parameters
+        ----------
+        positions : np.ndarray
+            Row positions of the products to calculate.
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame indexed by lot code with the columns:
+            - coste: sum of consumo_unitario * coste_componente_unitario
+            - pendientes: number of components without cost
+        """
+        coste = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)[positions]
+        consumo = self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[positions]
+        return (
+            pd.DataFrame({
+                'lote': self._lot_codes[positions],
+                'coste': consumo * coste,
+                'pendientes': np.isnan(coste)
+            })
+            .groupby('lote')
+            .sum()
+        )
+    
+    def _print_concise_summary(self) -> None:
+        """
+        Prints a summary of the final cost calculation status (private method).
+        """
+        nulos_final = self.fabricaciones['coste_componente_unitario'].isna().sum()
+        self._log("\nResumen final:")
+        self._log(f"Total registros: {len(self.fabricaciones)}")
+        self._log(f"Registros sin coste: {nulos_final}")
+        self._log(f"Registros con coste calculado: {len(self.fabricaciones) - nulos_final}")
+
+    def generate_manufacturing_costs(self) -> pd.DataFrame:
+        """
+        Generates a summarized DataFrame with manufacturing costs per order.
+        
+        Costs are summed straight from the internal arrays on the integer
+        order code, without copying the fabrication frame. Orders are coded
+        in date order, so the result needs no sort.
+        
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame sorted by fecha_fabricacion with the columns:
+            - id_orden
+            - fecha_fabricacion
+            - articulo
+            - unidades_fabricadas
+            - coste_unitario
+        """
+        # Verify that all costs have been calculated
+        if self.fabricaciones['coste_componente_unitario'].isna().any():
+            self._log("ADVERTENCIA: Hay costes pendientes de calcular. Los resultados pueden ser incompletos.")
+        
+        with self._stage('costes_fabricacion') as record:
+            costes_fabricacion = self._order_costs()
+            record.update(ordenes=len(costes_fabricacion))
+        
+        self._log("\nResumen de costes de fabricación:")
+        self._log(f"Total órdenes procesadas: {len(costes_fabricacion)}")
+        self._log(f"Rango de fechas: {costes_fabricacion['fecha_fabricacion'].min()} a {costes_fabricacion['fecha_fabricacion'].max()}")
+        
+        return costes_fabricacion
+
+    def _order_costs(self, orders: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Sums the component costs of each order from the internal arrays (private method).
+
+        Date, article and units are taken from the first row of each order.
+
+        Parameters
+        ----------
+        orders : np.ndarray, optional
+            Sorted order codes to summarize, by default all orders.
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame in date order with the columns id_orden, fecha_fabricacion,
+            articulo, unidades_fabricadas and coste_unitario.
+        """
+        if orders is None:
+            orders = np.arange(len(self._orders))
+            rows = self._rows_by_order
+        else:
+            rows = BomGraph.gather(self._order_indptr, self._rows_by_order, orders)
+
+        coste = self.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)[rows]
+        consumo = self.fabricaciones['consumo_unitario'].to_numpy(dtype=float)[rows]
+        totals = np.bincount(
+            np.searchsorted(orders, self._order_codes[rows]),
+            weights=np.nan_to_num(consumo * coste),
+            minlength=len(orders)
+        )
+
+        first = self._rows_by_order[self._order_indptr[orders]]
+        return pd.DataFrame({
+            'id_orden': self._orders[orders],
+            'fecha_fabricacion': self.fabricaciones['fecha_fabricacion'].to_numpy()[first],
+            'articulo': self._items[self._articulo_codes[first]],
+            'unidades_fabricadas': self.fabricaciones['unidades_fabricadas'].to_numpy()[first],
+            'coste_unitario': totals
+        })
+
+    @staticmethod
+    def split_by_period(fabricaciones: pd.DataFrame, freq: str = 'M') -> Iterator[pd.DataFrame]:
+        """
+        Yields the fabrications of each period in date order, for `calculate_partitioned`.
+
+        Parameters
+        ----------
+        fabricaciones : pd.DataFrame
+            DataFrame with fabrications.
+        freq : str, default 'M'
+            Period of each partition ('M' = month, 'Q' = quarter, ...).
+
+        Returns
+        -------
+        Iterator[pd.DataFrame]
+            One DataFrame per period.
+        """
+        periods = fabricaciones['fecha_fabricacion'].dt.to_period(freq)
+        for _, partition in fabricaciones.groupby(periods, sort=True):
+            yield partition
+
+    @classmethod
+    def calculate_partitioned(cls,
+                              partitions: Iterable[pd.DataFrame],
+                              horizon: Optional[int] = 12,
+                              verbose: bool = True,
+                              callbacks: Optional[List[Callable[[Dict], None]]] = None,
+                              **options) -> pd.DataFrame:
+        """
+        Calculates manufacturing costs one date partition at a time and gathers them in one frame.
+
+        Runs `iter_partitioned` and sets `coste_provisional` on the earlier
+        orders that later partitions report as revised. Only the result grows
+        with the history; use `iter_partitioned` to consume the order costs
+        of each partition as they come.
+
+        Parameters
+        ----------
+        partitions : iterable of pd.DataFrame
+            Fabrication frames in date order, for instance
+            `CostCalculator.split_by_period(fabricaciones)` or monthly files
+            read lazily.
+        horizon : int, optional
+            See `iter_partitioned`, by default 12 partitions.
+        verbose : bool, default True
+            If False, nothing is printed to the console.
+        callbacks : list of callables, optional
+            See `iter_partitioned`.
+        **options
+            Keyword arguments of `calculate_costs_recursively`.
+
+        Returns
+        -------
+        pd.DataFrame
+            Manufacturing costs of every order, with the same columns as
+            `generate_manufacturing_costs` plus coste_provisional.
+        """
+        results, revised = [], []
+        for costes, revisadas in cls.iter_partitioned(partitions, horizon, verbose, callbacks, **options):
+            results.append(costes)
+            revised.append(revisadas)
+
+        costes_fabricacion = pd.concat(results, ignore_index=True)
+        if revised:
+            revisadas = costes_fabricacion['id_orden'].isin(np.concatenate(revised))
+            costes_fabricacion.loc[revisadas, 'coste_provisional'] = True
+        if verbose:
+            print(f"\nTotal órdenes procesadas: {len(costes_fabricacion)}")
+            print(f"Órdenes con coste provisional: {int(costes_fabricacion['coste_provisional'].sum())}")
+        return costes_fabricacion
+
+    @classmethod
+    def iter_partitioned(cls,
+                         partitions: Iterable[pd.DataFrame],
+                         horizon: Optional[int] = 12,
+                         verbose: bool = True,
+                         callbacks: Optional[List[Callable[[Dict], None]]] = None,
+                         **options) -> Iterator[tuple]:
+        """
+        Calculates manufacturing costs one date partition at a time, yielding the orders of each.
+
+        Only one partition is held in memory at once. Between partitions only
+        the resolved costs of semi-finished (SEM) lots are carried forward:
+        before costing a partition, the carried lots it consumes (or falls
+        back to, for SEM lots never manufactured) are added as already-costed
+        lots. A carried lot that the partition
+        manufactures again is added as well, so its cost sums the rows of
+        every partition, as in a full-history run.
+
+        Partitions must come in date order, and a SEM lot is only known to
+        the partitions after the one that manufactures it. Orders whose cost
+        may therefore differ from a full-history run are flagged in
+        `coste_provisional`: at some depth they use a SEM lot matched by a
+        fallback lot of its article, a SEM lot not available yet, or a SEM lot
+        that a later partition manufactures again. Flags are kept per lot;
+        the earlier orders that a partition turns provisional are yielded
+        with it instead of being edited in place.
+
+        To update those flags, the lot -> consumer lot edges and the lot of
+        every order are kept as integer tables of hashed lot labels. Memory
+        stays bounded by `horizon`: edges and orders older than `horizon`
+        partitions are dropped, and so are the carried lots not manufactured
+        or consumed within `horizon` partitions, except the latest lot of each
+        SEM article. A dropped lot consumed later is matched by that latest lot
+        and flagged; a dropped lot manufactured again starts from the rows of
+        the new partition.
+
+        Parameters
+        ----------
+        partitions : iterable of pd.DataFrame
+            Fabrication frames in date order, for instance
+            `CostCalculator.split_by_period(fabricaciones)` or monthly files
+            read lazily.
+        horizon : int, optional
+            Number of earlier partitions a partition can revise and during
+            which an unused SEM lot is carried, by default 12. None keeps the
+            whole history, so memory grows with it.
+        verbose : bool, default True
+            If False, nothing is printed to the console.
+        callbacks : list of callables, optional
+            Functions called with every progress record of every partition,
+            and with one record per partition (etapa 'particion') with its
+            number, orders, revised orders, carried and known SEM lots, kept
+            edges, duration and peak memory.
+        **options
+            Keyword arguments of `calculate_costs_recursively`.
+
+        Yields
+        ------
+        tuple
+            (costes, revisadas): manufacturing costs of the orders of the
+            partition, with the same columns as `generate_manufacturing_costs`
+            plus coste_provisional, and the id_orden of the orders of earlier
+            partitions whose cost became provisional with this partition.
+        """
+        carried = pd.DataFrame(
+            {'coste': pd.Series(dtype=float), 'fecha': pd.Series(dtype='datetime64[ns]'),
+             'provisional': pd.Series(dtype=bool), 'ultima': pd.Series(dtype=np.int64),
+             'clave': pd.Series(dtype=np.uint64)},
+            index=pd.MultiIndex.from_arrays([[], []], names=['articulo', 'lote_articulo'])
+        )
+        edges = pd.DataFrame({'hijo': pd.Series(dtype=np.uint64), 'padre': pd.Series(dtype=np.uint64),
+                              'particion': pd.Series(dtype=np.int64)})
+        lot_orders = pd.DataFrame({'lote': pd.Series(dtype=np.uint64), 'id_orden': pd.Series(dtype=object),
+                                   'particion': pd.Series(dtype=np.int64)})
+
+        for number, partition in enumerate(partitions, start=1):
+            start = time.perf_counter()
+            if horizon is not None:
+                oldest = number - horizon
+                edges = edges[edges['particion'].to_numpy() >= oldest]
+                lot_orders = lot_orders[lot_orders['particion'].to_numpy() >= oldest]
+                fechas = carried['fecha'].groupby(level='articulo').transform('max')
+                carried = carried[(carried['ultima'].to_numpy() >= oldest) | (carried['fecha'] == fechas).to_numpy()]
+
+            # Earlier consumers of the carried lots manufactured again used a partial cost
+            manufactured = cls._lot_hashes(partition['articulo'], partition['lote_articulo'])
+            keys = carried['clave'].to_numpy()
+            revisadas = lot_orders['id_orden'].to_numpy()[:0]
+            extended = keys[np.isin(keys, manufactured)]
+            if len(extended):
+                reached = cls._consumers(edges['hijo'].to_numpy(), edges['padre'].to_numpy(), extended)
+                revisadas = pd.unique(lot_orders['id_orden'].to_numpy()[np.isin(lot_orders['lote'].to_numpy(), reached)])
+                carried = carried.assign(provisional=carried['provisional'].to_numpy() | np.isin(keys, reached))
+
+            # The frame of the caller is copied unless carried rows were already appended to a new one
+            combined = cls._add_carried_lots(partition, carried[['coste', 'fecha']])
+            calculator = cls(combined, verbose=False, callbacks=callbacks, copy=combined is partition)
+            calculator.calculate_costs_recursively(**options)
+
+            lot_flags, order_flags = calculator._provisional_flags(carried.index[carried['provisional']])
+            costes = calculator._order_costs().assign(coste_provisional=order_flags)
+            costes = costes[costes['id_orden'] != cls.CARRIED_ORDER].reset_index(drop=True)
+
+            # Consumption edges and order lots of this partition, on hashed lot labels
+            lot_keys = cls._lot_hashes(calculator._lots.get_level_values('articulo'),
+                                       calculator._lots.get_level_values('lote_articulo'))
+            rows = np.flatnonzero(calculator._component_lot_codes >= 0)
+            pairs = np.unique(calculator._component_lot_codes[rows] * len(lot_keys) + calculator._lot_codes[rows])
+            rows = np.flatnonzero(
+                (calculator._order_codes >= 0) & (calculator.fabricaciones['id_orden'] != cls.CARRIED_ORDER).to_numpy()
+            )
+            ordered = np.unique(calculator._order_codes[rows] * len(lot_keys) + calculator._lot_codes[rows])
+            edges = pd.concat([edges, pd.DataFrame({
+                'hijo': lot_keys[pairs // len(lot_keys)], 'padre': lot_keys[pairs % len(lot_keys)], 'particion': number
+            })], ignore_index=True)
+            lot_orders = pd.concat([lot_orders, pd.DataFrame({
+                'lote': lot_keys[ordered % len(lot_keys)],
+                'id_orden': np.asarray(calculator._orders, dtype=object)[ordered // len(lot_keys)],
+                'particion': number
+            })], ignore_index=True)
+
+            sem = (calculator._lots.get_level_values('articulo').str.startswith('SEM')
+                   & ~np.isnan(calculator._lot_costs))
+            semis = pd.DataFrame(
+                {'coste': calculator._lot_costs[sem], 'fecha': calculator._lot_dates[sem].astype('datetime64[ns]'),
+                 'provisional': lot_flags[sem], 'ultima': number, 'clave': lot_keys[sem]},
+                index=calculator._lots[sem]
+            )
+            carried = pd.concat([carried[~carried.index.isin(semis.index)], semis]).sort_index()
+            # Labels of dropped lots would otherwise stay in the index levels
+            carried.index = carried.index.remove_unused_levels()
+
+            record = {
+                'etapa': 'particion',
+                'particion': number,
+                'ordenes': len(costes),
+                'ordenes_revisadas': len(revisadas),
+                'lotes_arrastrados': int(combined['id_orden'].eq(cls.CARRIED_ORDER).sum()),
+                'lotes_conocidos': len(carried),
+                'aristas': len(edges),
+                'segundos': time.perf_counter() - start,
+                'memoria_pico_mb': cls._peak_memory_mb()
+            }
+            for callback in callbacks or []:
+                callback(record)
+            if verbose:
+                print(f"Partición {number}: {record['ordenes']} órdenes, "
+                      f"{record['ordenes_revisadas']} órdenes anteriores revisadas, "
+                      f"{record['lotes_arrastrados']} lotes SEM arrastrados, "
+                      f"{record['lotes_conocidos']} lotes SEM conocidos")
+            # Frames of the partition are freed now rather than whenever the cyclic collector runs
+            del calculator, combined, partition
+            gc.collect()
+            yield costes, revisadas
+
+    def _provisional_flags(self, provisional_lots: pd.MultiIndex) -> tuple:
+        """
+        Flags the lots and orders of a partition whose cost uses an approximate SEM lot (private method).
+
+        A row is approximate when its SEM lot was matched by a fallback lot of
+        the article or is not available, or when it consumes a lot that is
+        flagged; flags are carried to every ancestor lot.
+
+        Parameters
+        ----------
+        provisional_lots : pd.MultiIndex
+            Carried lots whose cost is already provisional.
+
+        Returns
+        -------
+        tuple
+            (lot_flags, order_flags): boolean arrays indexed by lot code and by order code.
+        """
+        children = self._component_lot_codes
+        sem = self.fabricaciones['componente'].str.startswith('SEM').to_numpy(dtype=bool)
+        approximate = self.fabricaciones['flag_lote_sustituido'].to_numpy(dtype=bool) | (sem & (children < 0))
+
+        seeds = np.concatenate([self._lot_codes[approximate], self._lots.get_indexer(provisional_lots)])
+        lot_flags = np.zeros(len(self._lots), dtype=bool)
+        lot_flags[self.graph.ancestors(seeds[seeds >= 0])] = True
+
+        rows = approximate | ((children >= 0) & lot_flags[np.maximum(children, 0)])
+        ordered = self._order_codes >= 0
+        order_flags = np.bincount(self._order_codes[ordered], weights=rows[ordered], minlength=len(self._orders)) > 0
+        return lot_flags, order_flags
+
+    @staticmethod
+    def _lot_hashes(articulos, lotes) -> np.ndarray:
+        """
+        Hashes (articulo, lote_articulo) labels into one uint64 key per lot (private method).
+
+        The keys identify lots across partitions, whose codes are not shared.
+        """
+        return pd.util.hash_pandas_object(
+            pd.DataFrame({'articulo': np.asarray(articulos, dtype=object), 'lote': np.asarray(lotes, dtype=object)}),
+            index=False
+        ).to_numpy()
+
+    @staticmethod
+    def _consumers(children: np.ndarray, parents: np.ndarray, lots: np.ndarray) -> np.ndarray:
+        """
+        Finds the lots that consume `lots`, directly or through other lots (private method).
+
+        Parameters
+        ----------
+        children, parents : np.ndarray
+            Consumed and consuming lot of every edge.
+        lots : np.ndarray
+            Consumed lots.
+
+        Returns
+        -------
+        np.ndarray
+            The consuming lots, sorted.
+        """
+        reached = parents[:0]
+        frontier = np.unique(lots)
+        while len(frontier):
+            frontier = np.setdiff1d(parents[np.isin(children, frontier)], reached)
+            reached = np.union1d(reached, frontier)
+        return reached
+
+    @classmethod
+    def _add_carried_lots(cls, partition: pd.DataFrame, carried: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adds one already-costed row per carried SEM lot the partition needs (private method).
+
+        Parameters
+        ----------
+        partition : pd.DataFrame
+            Fabrications of the partition.
+        carried : pd.DataFrame
+            Unit cost (coste) and date (fecha) of the SEM lots resolved so far,
+            indexed by (articulo, lote_articulo).
+
+        Returns
+        -------
+        pd.DataFrame
+            The partition plus the carried lots it consumes, falls back to or
+            manufactures again.
+        """
+        if carried.empty:
+            return partition
+
+        sem = partition['componente'].str.startswith('SEM').to_numpy(dtype=bool)
+        consumed = pd.MultiIndex.from_arrays([
+            partition['componente'].to_numpy()[sem], partition['lote_componente'].to_numpy()[sem]
+        ])
+        manufactured = pd.MultiIndex.from_arrays([partition['articulo'], partition['lote_articulo']])
+
+        # Fallback lot of the rows without an exact carried lot, as in _fallback_lots:
+        # the last lot dated on or before the row, else the first one
+        rows = pd.DataFrame({
+            'articulo': consumed.get_level_values(0),
+            'fecha': partition['fecha_fabricacion'].to_numpy()[sem]
+        })[~consumed.isin(carried.index)].dropna().sort_values('fecha')
+        lots = carried.reset_index().dropna(subset=['fecha']).sort_values(['fecha', 'lote_articulo'])
+        fallback = pd.merge_asof(rows, lots[['articulo', 'fecha', 'lote_articulo']], on='fecha', by='articulo')
+        first = lots.drop_duplicates('articulo').set_index('articulo')['lote_articulo']
+        fallback = pd.MultiIndex.from_arrays([
+            fallback['articulo'], fallback['lote_articulo'].fillna(fallback['articulo'].map(first))
+        ])
+
+        # Lots manufactured again start from the cost of their earlier rows
+        needed = carried.index.isin(consumed) | carried.index.isin(manufactured) | carried.index.isin(fallback)
+        lots = carried[needed]
+        if lots.empty:
+            return partition
+
+        synthetic = pd.DataFrame({
+            'id_orden': cls.CARRIED_ORDER,
+            'fecha_fabricacion': lots['fecha'].to_numpy(),
+            'articulo': lots.index.get_level_values('articulo'),
+            'lote_articulo': lots.index.get_level_values('lote_articulo'),
+            'unidades_fabricadas': np.nan,
+            'componente': cls.CARRIED_ORDER,
+            'lote_componente': cls.CARRIED_ORDER,
+            'coste_componente_unitario': lots['coste'].to_numpy(),
+            'consumo_unitario': 1.0,
+            'consumo_total': np.nan
+        })
+        return pd.concat([partition, synthetic], ignore_index=True)
+
+    def build_lookup(self) -> CostLookup:
+        """
+        Freezes the lot and order unit costs of the last rollup into a read-only index.
+
+        Returns
+        -------
+        CostLookup
+            Lookup answering point and batch queries by (articulo, lote_articulo)
+            and by id_orden with hashed index lookups.
+        """
+        if not hasattr(self, '_lot_costs'):
+            raise ValueError("Debes ejecutar calculate_costs_recursively antes de construir la búsqueda de costes.")
+
+        order_costs = self._order_costs()
+        return CostLookup(
+            lots=self._lots.remove_unused_levels(),
+            lot_costs=self._lot_costs,
+            orders=pd.Index(order_costs['id_orden'], name='id_orden'),
+            order_costs=order_costs['coste_unitario'].to_numpy()
+        )
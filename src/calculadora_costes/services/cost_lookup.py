@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class CostLookup:
+    """
+    Read-only index of the unit costs produced by a rollup.
+
+    Built once by `CostCalculator.build_lookup`. Keys are kept as sorted
+    pandas indexes and costs as read-only numpy arrays aligned with them, so
+    a batch query is one `get_indexer` call and the object pickles as a few
+    flat arrays.
+
+    Attributes:
+        lots: Sorted MultiIndex of (articulo, lote_articulo)
+        lot_costs: Unit cost of each entry of `lots` (read-only)
+        orders: Sorted Index of id_orden
+        order_costs: Unit cost of each entry of `orders` (read-only)
+
+    Returns
+    -------
+    CostLookup
+        The lookup structure.
+    """
+    lots: pd.MultiIndex
+    lot_costs: np.ndarray
+    orders: pd.Index
+    order_costs: np.ndarray
+
+    def __post_init__(self):
+        """
+        Sorts the keys and freezes the cost arrays (private method).
+        """
+        for keys, costs in (('lots', 'lot_costs'), ('orders', 'order_costs')):
+            index = getattr(self, keys)
+            values = np.array(getattr(self, costs), dtype=float)
+            order = index.argsort()
+            values = values[order]
+            values.setflags(write=False)
+            object.__setattr__(self, keys, index[order])
+            object.__setattr__(self, costs, values)
+
+    def __reduce__(self):
+        """
+        Pickles the lookup through its constructor, so the arrays stay read-only (private method).
+        """
+        return self.__class__, (self.lots, self.lot_costs, self.orders, self.order_costs)
+
+    @staticmethod
+    def _take(costs: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """
+        Returns the costs at `positions`, NaN where a position is -1 (private method).
+        """
+        found = positions >= 0
+        result = np.full(len(positions), np.nan)
+        result[found] = costs[positions[found]]
+        return result
+
+    def get_lot_cost(self, articulo: str, lote_articulo: str) -> float:
+        """
+        Returns the unit cost of a product lot, NaN if unknown or not costed.
+        """
+        try:
+            return float(self.lot_costs[self.lots.get_loc((articulo, lote_articulo))])
+        except KeyError:
+            return np.nan
+
+    def get_lot_costs(self, articulos, lotes_articulo) -> np.ndarray:
+        """
+        Returns the unit cost of several product lots.
+
+        Parameters
+        ----------
+        articulos : array-like
+            Article of each query.
+        lotes_articulo : array-like
+            Lot of each query.
+
+        Returns
+        -------
+        np.ndarray
+            Unit cost of each query, NaN for unknown lots.
+        """
+        queries = pd.MultiIndex.from_arrays([
+            np.asarray(articulos, dtype=object), np.asarray(lotes_articulo, dtype=object)
+        ])
+        return self._take(self.lot_costs, self.lots.get_indexer(queries))
+
+    def get_order_cost(self, id_orden: str) -> float:
+        """
+        Returns the unit cost of a manufacturing order, NaN if unknown.
+        """
+        try:
+            return float(self.order_costs[self.orders.get_loc(id_orden)])
+        except KeyError:
+            return np.nan
+
+    def get_order_costs(self, ids_orden) -> np.ndarray:
+        """
+        Returns the unit cost of several manufacturing orders.
+
+        Parameters
+        ----------
+        ids_orden : array-like
+            Order of each query.
+
+        Returns
+        -------
+        np.ndarray
+            Unit cost of each query, NaN for unknown orders.
+        """
+        return self._take(self.order_costs, self.orders.get_indexer(np.asarray(ids_orden, dtype=object)))
@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+from calculadora_costes.services.bom_graph import BomGraph
+from calculadora_costes.services.price_index import PriceIndex
+
+
+class InventoryCosting:
+    """
+    Moving average and FIFO costing of component consumption over the purchase history.
+
+    Purchases are indexed once by (componente, fecha_precio) with a
+    `PriceIndex` and turned into cumulative unit and value arrays. Consumptions are placed on the same
+    cumulative unit axis, so both methods reduce to cumulative sums and binary
+    searches over flat arrays, with no loop over transactions.
+
+    The purchase history usually starts long before the fabrications. For each
+    component, the stock on hand at its first consumption is taken to be the
+    last purchase received on or before that date; earlier purchases are
+    considered already consumed.
+    """
+
+    def __init__(self,
+                 compras: pd.DataFrame,
+                 component_column: str = 'componente',
+                 date_column: str = 'fecha_precio',
+                 units_column: str = 'unidades_compradas',
+                 price_column: str = 'coste_componente_unitario'):
+        """
+        Initializes the costing engine from the purchase history.
+
+        Parameters
+        ----------
+        compras : pd.DataFrame
+            Purchase history with one row per received lot.
+        component_column : str, default 'componente'
+            Column with the component code.
+        date_column : str, default 'fecha_precio'
+            Column with the purchase date (FECDOC).
+        units_column : str, default 'unidades_compradas'
+            Column with the units received (UNIDADES).
+        price_column : str, default 'coste_componente_unitario'
+            Column with the unit price (PRCMONEDA).
+
+        Returns
+        -------
+        InventoryCosting
+            The initialized costing engine.
+        """
+        compras = compras[compras[units_column].to_numpy(dtype=float) > 0]
+        self._index = PriceIndex(compras, component_column, date_column, price_column)
+        self.componentes = self._index.componentes
+        self._keys = self._index.keys
+        self._codes = self._index.codes
+        self._units = self._index.sorted_values(compras[units_column].to_numpy(dtype=float))
+        self._prices = self._index.prices
+
+        # Cumulative units and value over all components, with a leading zero
+        self._cum_units = np.concatenate([[0.0], np.cumsum(self._units)])
+        self._cum_values = np.concatenate([[0.0], np.cumsum(self._units * self._prices)])
+        self._indptr = BomGraph.indptr(self._codes, len(self.componentes))
+
+    def _place_consumptions(self, componentes, fechas, cantidades) -> dict:
+        """
+        Places each consumption on the cumulative purchased-units axis (private method).
+
+        Consumptions are ordered by component and date; within a day they keep
+        the order in which they are given.
+
+        Returns
+        -------
+        dict
+            Arrays aligned with the input:
+            - last: purchase received last on or before the date, -1 if none
+            - stock_in: cumulative units received up to that purchase
+            - start, end: cumulative position of the units consumed
+            - opening: cumulative position where each component's stock starts
+            - sorted_keys, sorted_codes, sorted_consumed: consumption keys and
+              components in (componente, date) order and the units consumed by
+              each component up to them
+        """
+        located = self._index.locate(componentes, fechas)
+        codes, keys, valid = located['codes'], located['keys'], located['valid']
+        quantities = np.nan_to_num(np.asarray(cantidades, dtype=float))
+        n = len(codes)
+
+        last = np.full(n, -1, dtype=np.int64)
+        opening = self._cum_units[self._indptr[:-1]]
+        if not len(self._keys) or not valid.any():
+            return {'last': last, 'stock_in': np.zeros(n), 'start': np.zeros(n), 'end': np.zeros(n),
+                    'opening': opening, 'sorted_keys': np.empty(0, dtype=np.int64),
+                    'sorted_codes': np.empty(0, dtype=np.int64), 'sorted_consumed': np.empty(0)}
+
+        found = located['found']
+        last[found] = located['positions'][found]
+
+        base = self._cum_units[self._indptr[np.maximum(codes, 0)]]
+        stock_in = np.where(found, self._cum_units[last + 1], base)
+
+        # Opening stock: only the last purchase on or before the first consumption
+        # Sorted on the unclipped days, so consumptions after the last purchase keep their date order
+        order = np.flatnonzero(valid)[np.lexsort((located['days'][valid], codes[valid]))]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = codes[order][1:] != codes[order][:-1]
+        group = np.cumsum(first) - 1
+        consumed_codes = codes[order][first]
+        opening[consumed_codes] = np.where(
+            found[order][first], self._cum_units[last[order][first]], base[order][first]
+        )
+
+        consumed = np.cumsum(quantities[order])
+        consumed_before = consumed - quantities[order]
+        start = np.zeros(n)
+        start[order] = opening[codes[order]] + consumed_before - consumed_before[first][group]
+
+        return {'last': last, 'stock_in': stock_in, 'start': start, 'end': start + quantities,
+                'opening': opening, 'sorted_keys': keys[order], 'sorted_codes': codes[order],
+                'sorted_consumed': consumed - consumed_before[first][group]}
+
+    def _value_at(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Value of the first `positions` cumulative units received (private method).
+        """
+        layers = np.clip(np.searchsorted(self._cum_units, positions, side='left') - 1, 0, len(self._units) - 1)
+        return self._cum_values[layers] + (positions - self._cum_units[layers]) * self._prices[layers]
+
+    def fifo(self, componentes, fechas, cantidades) -> np.ndarray:
+        """
+        Returns the FIFO unit cost of each consumption.
+
+        Each consumption takes the oldest units still in stock. Units consumed
+        beyond what was received by that date are valued at the last purchase
+        price, and the next purchases cover that shortage first.
+
+        Parameters
+        ----------
+        componentes : array-like
+            Component code of each consumption.
+        fechas : array-like
+            Date of each consumption.
+        cantidades : array-like
+            Units consumed.
+
+        Returns
+        -------
+        np.ndarray
+            Unit cost of each consumption, NaN when nothing was purchased before its date.
+        """
+        placed = self._place_consumptions(componentes, fechas, cantidades)
+        last, stock_in, start, end = placed['last'], placed['stock_in'], placed['start'], placed['end']
+        if not len(self._keys):
+            return np.full(len(last), np.nan)
+
+        last_price = np.where(last >= 0, self._prices[np.maximum(last, 0)], np.nan)
+        in_stock = self._value_at(np.minimum(end, stock_in)) - self._value_at(np.minimum(start, stock_in))
+        shortage = np.maximum(end - np.maximum(start, stock_in), 0)
+        quantities = end - start
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            costs = (in_stock + shortage * last_price) / quantities
+        return np.where((last >= 0) & (quantities > 0), costs, last_price)
+
+    def moving_average(self, componentes, fechas, cantidades) -> np.ndarray:
+        """
+        Returns the weighted moving average unit cost of each consumption.
+
+        The average is updated at every purchase with the stock on hand at
+        that moment (received minus consumed), and consumptions leave it
+        unchanged. The recurrence avg_k = w_k * avg_k-1 + (1 - w_k) * price_k
+        is solved for all purchases at once with a prefix scan.
+
+        Parameters
+        ----------
+        componentes : array-like
+            Component code of each consumption.
+        fechas : array-like
+            Date of each consumption.
+        cantidades : array-like
+            Units consumed.
+
+        Returns
+        -------
+        np.ndarray
+            Unit cost of each consumption, NaN when nothing was purchased before its date.
+        """
+        placed = self._place_consumptions(componentes, fechas, cantidades)
+        last = placed['last']
+        if not len(self._keys):
+            return np.full(len(last), np.nan)
+
+        # Units consumed strictly before each purchase day, per component
+        sorted_keys = np.concatenate([[-1], placed['sorted_keys']])
+        sorted_codes = np.concatenate([[-1], placed['sorted_codes']])
+        sorted_consumed = np.concatenate([[0.0], placed['sorted_consumed']])
+        before = np.searchsorted(sorted_keys, self._keys, side='left') - 1
+        same = sorted_codes[before] == self._codes
+        consumed = np.where(same, sorted_consumed[before], 0.0)
+
+        stock = np.maximum(self._cum_units[:-1] - placed['opening'][self._codes] - consumed, 0)
+        weights = stock / (stock + self._units)
+        averages = self._linear_scan(weights, (1 - weights) * self._prices)
+
+        return np.where(last >= 0, averages[np.maximum(last, 0)], np.nan)
+
+    @staticmethod
+    def _linear_scan(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """
+        Solves x_k = a_k * x_k-1 + b_k for every k with a Hillis-Steele prefix scan (private method).
+
+        Affine maps are composed over doubling strides, so the recurrence is
+        solved in log2(n) vectorized steps. A zero `a_k` restarts the sequence.
+        """
+        a = a.astype(float, copy=True)
+        b = b.astype(float, copy=True)
+        stride = 1
+        while stride < len(a):
+            b[stride:] = a[stride:] * b[:-stride] + b[stride:]
+            a[stride:] = a[stride:] * a[:-stride]
+            stride *= 2
+        return b
@@ -0,0 +1,225 @@
+import numpy as np
+import pandas as pd
+
+
+class PriceIndex:
+    """
+    Sorted per-component index of dated purchase prices.
+
+    Prices are sorted once by (componente, fecha_precio) and stored as flat
+    arrays, so any number of lookups is answered with one vectorized binary
+    search instead of a merge per component.
+
+    The prices can also be ordered by the internal lot code instead of the
+    date: 'YYMM-NNN' codes sort chronologically, so the last lot on or
+    before a given lot is the closest earlier purchase.
+    """
+
+    def __init__(self,
+                 precios: pd.DataFrame,
+                 component_column: str = 'componente',
+                 date_column: str = 'fecha_precio',
+                 price_column: str = 'coste_componente_unitario'):
+        """
+        Initializes the index from the dated purchase history.
+
+        Parameters
+        ----------
+        precios : pd.DataFrame
+            Purchase history with one row per dated price.
+        component_column : str, default 'componente'
+            Column with the component code.
+        date_column : str, default 'fecha_precio'
+            Column that orders the prices: the purchase date (FECDOC), or a
+            text column such as lote_componente, ordered lexicographically.
+        price_column : str, default 'coste_componente_unitario'
+            Column with the unit price.
+
+        Returns
+        -------
+        PriceIndex
+            The initialized price index.
+        """
+        kept = precios[[component_column, date_column, price_column]].notna().all(axis=1).to_numpy()
+        precios = precios[kept]
+        codes, self.componentes = pd.factorize(precios[component_column], sort=True)
+
+        # Text columns are ranked within their sorted vocabulary
+        self._vocabulary = None
+        if not pd.api.types.is_datetime64_any_dtype(precios[date_column]):
+            self._vocabulary = np.unique(precios[date_column].to_numpy(dtype=str))
+        days = self._positions(precios[date_column])
+
+        # Day 0 of every component is before its first price and day span - 1 after its last one,
+        # so query keys never reach into the range of another component
+        self._origin = (days.min() - 1) if len(days) else 0
+        self._span = (days.max() - self._origin + 2) if len(days) else 2
+
+        # Stable sort keeps file order within a day, so the last price of the day wins
+        keys = codes * self._span + (days - self._origin)
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._codes = codes[order]
+        self._prices = precios[price_column].to_numpy(dtype=float)[order]
+        # Position in the given frame of every indexed price
+        self._rows = np.flatnonzero(kept)[order]
+        for array in (self._keys, self._codes, self._prices):
+            array.setflags(write=False)
+
+    @property
+    def keys(self) -> np.ndarray:
+        """
+        Sorted (componente, fecha_precio) key of every indexed price (read-only).
+
+        Keys returned by `locate` for queries are comparable with them.
+        """
+        return self._keys
+
+    @property
+    def codes(self) -> np.ndarray:
+        """
+        Component code (position in `componentes`) of every indexed price, in index order (read-only).
+        """
+        return self._codes
+
+    @property
+    def prices(self) -> np.ndarray:
+        """
+        Every indexed price, in index order (read-only).
+        """
+        return self._prices
+
+    @staticmethod
+    def _to_days(fechas) -> np.ndarray:
+        """
+        Converts dates to integer days since the epoch (private method).
+        """
+        return pd.DatetimeIndex(fechas).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+    def _positions(self, values) -> np.ndarray:
+        """
+        Converts dates to days, or text to its rank in the vocabulary (private method).
+
+        A text absent from the vocabulary gets the rank of the last entry
+        before it, -1 if there is none.
+        """
+        if self._vocabulary is None:
+            return self._to_days(values)
+        return np.searchsorted(self._vocabulary, np.asarray(values, dtype=str), side='right') - 1
+
+    def _component_codes(self, componentes) -> np.ndarray:
+        """
+        Looks up the index code of every component label, -1 if unknown (private method).
+        """
+        codes, uniques = pd.factorize(np.asarray(componentes, dtype=object))
+        # Missing labels (code -1) take the trailing -1
+        return np.append(self.componentes.get_indexer(uniques), -1)[codes]
+
+    def sorted_values(self, values) -> np.ndarray:
+        """
+        Returns a column of the frame the index was built from, in index order.
+
+        Parameters
+        ----------
+        values : array-like
+            One value per row of that frame.
+
+        Returns
+        -------
+        np.ndarray
+            The values of the indexed rows, sorted by (componente, fecha_precio).
+        """
+        return np.asarray(values)[self._rows]
+
+    def _query_keys(self, componentes, fechas) -> tuple:
+        """
+        Encodes (componente, fecha) queries as composite keys of the index (private method).
+
+        Returns
+        -------
+        tuple
+            (codes, keys, valid, days): component code of each query (-1 if
+            unknown), its composite key, whether both parts are known (keys of
+            invalid queries are -1) and its date as days since the origin of
+            the index. Keys clip dates outside the indexed range; days do not.
+        """
+        codes = self._component_codes(componentes)
+        if self._vocabulary is None:
+            fechas = pd.DatetimeIndex(fechas)
+            missing = fechas.isna()
+        else:
+            fechas = pd.Series(fechas, dtype=object)
+            missing = fechas.isna().to_numpy()
+            fechas = fechas.fillna('')
+        valid = (codes >= 0) & ~missing
+        days = self._positions(fechas) - self._origin
+        keys = codes * self._span + np.clip(days, 0, self._span - 1)
+        return codes, np.where(valid, keys, -1), valid, days
+
+    def _last_positions(self, codes: np.ndarray, keys: np.ndarray, valid: np.ndarray) -> tuple:
+        """
+        Finds the last indexed price of the same component on or before each query key (private method).
+
+        Returns
+        -------
+        tuple
+            (positions, found): position in the sorted arrays and whether the
+            component has such a price.
+        """
+        positions = np.searchsorted(self._keys, keys, side='right') - 1
+        if not len(self._keys):
+            return positions, np.zeros(len(keys), dtype=bool)
+        found = valid & (positions >= 0) & (self._keys[np.maximum(positions, 0)] // self._span == codes)
+        return positions, found
+
+    def locate(self, componentes, fechas) -> dict:
+        """
+        Finds the last indexed price of the same component on or before each query.
+
+        Parameters
+        ----------
+        componentes : array-like
+            Component code of each query.
+        fechas : array-like
+            Date (or lot code) of each query.
+
+        Returns
+        -------
+        dict
+            Arrays aligned with the queries:
+            - codes: component code, -1 if unknown
+            - keys: key comparable with `keys`, -1 if the component or date is missing
+            - valid: whether both component and date are known
+            - days: date as days since the origin of the index; unlike keys,
+              not clipped to the indexed range, so they keep the query order
+            - positions: position in the index of the last price on or before the query
+            - found: whether the component has such a price
+        """
+        codes, keys, valid, days = self._query_keys(componentes, fechas)
+        positions, found = self._last_positions(codes, keys, valid)
+        return {'codes': codes, 'keys': keys, 'valid': valid, 'days': days, 'positions': positions, 'found': found}
+
+    def asof(self, componentes, fechas) -> np.ndarray:
+        """
+        Returns the price of each component valid on each date.
+
+        The valid price is the last one purchased on or before the date (or
+        on or before the lot, for an index ordered by lot).
+
+        Parameters
+        ----------
+        componentes : array-like
+            Component code of each query.
+        fechas : array-like
+            Date (or lot code) of each query.
+
+        Returns
+        -------
+        np.ndarray
+            Price of each query, NaN when the component has no earlier price.
+        """
+        located = self.locate(componentes, fechas)
+        found = located['found']
+        prices = np.full(len(found), np.nan)
+        prices[found] = self._prices[located['positions'][found]]
+        return prices
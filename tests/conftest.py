@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+# Synthetic BOM generator of the benchmarks
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+
+@pytest.fixture(scope='session')
+def fabricaciones() -> pd.DataFrame:
+    """
+    Cleaned sample fabrications shipped in data/clean.
+    """
+    frame = pd.read_csv(
+        os.path.join(ROOT, 'data', 'clean', 'fabricaciones_clean.csv'),
+        dtype={'id_orden': str, 'articulo': str, 'lote_articulo': str, 'componente': str, 'lote_componente': str},
+        parse_dates=['fecha_fabricacion']
+    )
+    return frame.drop(columns='flag_coste_calculado')
+
+
+@pytest.fixture(scope='session')
+def build_fabricaciones():
+    """
+    Builds a small fabrication frame from tuples
+    (id_orden, fecha, articulo, lote_articulo, componente, lote_componente, coste, consumo).
+    """
+    def build(rows) -> pd.DataFrame:
+        frame = pd.DataFrame(rows, columns=[
+            'id_orden', 'fecha_fabricacion', 'articulo', 'lote_articulo', 'componente', 'lote_componente',
+            'coste_componente_unitario', 'consumo_unitario'
+        ])
+        frame['fecha_fabricacion'] = pd.to_datetime(frame['fecha_fabricacion'])
+        frame['coste_componente_unitario'] = frame['coste_componente_unitario'].astype(float)
+        frame['consumo_unitario'] = frame['consumo_unitario'].astype(float)
+        frame.insert(4, 'unidades_fabricadas', 1.0)
+        frame['consumo_total'] = frame['consumo_unitario']
+        return frame
+    return build
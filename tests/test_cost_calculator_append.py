@@ -0,0 +1,198 @@
+"""
+CostCalculator.append must leave the calculator as a full run on all the rows would.
+
+Appended lots take the next lot codes instead of their sorted position, so
+lot-keyed structures are compared by (articulo, lote_articulo) label; row and
+order structures are compared as they are.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculadora_costes.services.bom_graph import BomGraph
+from calculadora_costes.services.cost_calculator import CostCalculator
+
+
+def _lot_labels(calculator: CostCalculator, codes: np.ndarray) -> list:
+    """
+    (articulo, lote_articulo) of each lot code, None for -1.
+    """
+    return [calculator._lots[code] if code >= 0 else None for code in codes]
+
+
+def _csr_by_lot(calculator: CostCalculator, indptr: np.ndarray, values: np.ndarray) -> dict:
+    """
+    Sorted values of every non-empty slice of a lot-keyed CSR index, keyed by lot label.
+    """
+    return {
+        calculator._lots[code]: sorted(values[indptr[code]:indptr[code + 1]].tolist())
+        for code in np.flatnonzero(np.diff(indptr))
+    }
+
+
+def _assert_same_state(appended: CostCalculator, full: CostCalculator) -> None:
+    """
+    Asserts that both calculators hold the same indexes, levels and costs.
+    """
+    # Rows
+    assert _lot_labels(appended, appended._lot_codes) == _lot_labels(full, full._lot_codes)
+    assert _lot_labels(appended, appended._component_lot_codes) == _lot_labels(full, full._component_lot_codes)
+
+    # Lots, levels and graph edges
+    assert sorted(appended._lots) == sorted(full._lots)
+    levels = pd.Series(appended.graph.levels, index=appended._lots).sort_index()
+    assert levels.equals(pd.Series(full.graph.levels, index=full._lots).sort_index())
+    assert appended.graph.n_levels == full.graph.n_levels
+    for calculator in (appended, full):
+        graph = calculator.graph
+        assert np.array_equal(graph.parents, np.repeat(np.arange(graph.n_nodes), np.diff(graph._parent_indptr)))
+        assert np.array_equal(np.sort(graph._parents_by_child), np.sort(graph.parents))
+    edges = [set(zip(_lot_labels(c, c.graph.parents), _lot_labels(c, c.graph.children))) for c in (appended, full)]
+    assert edges[0] == edges[1]
+
+    # Lot dates and rows matched to a fallback lot
+    dates = [pd.Series(c._lot_dates, index=c._lots).sort_index() for c in (appended, full)]
+    assert dates[0].equals(dates[1])
+    assert np.array_equal(appended.fabricaciones['flag_lote_sustituido'], full.fabricaciones['flag_lote_sustituido'])
+
+    # Lot and where-used indexes
+    assert (_csr_by_lot(appended, appended._lot_indptr, appended._rows_by_lot)
+            == _csr_by_lot(full, full._lot_indptr, full._rows_by_lot))
+    assert (_csr_by_lot(appended, appended._where_used_indptr, appended._where_used_rows)
+            == _csr_by_lot(full, full._where_used_indptr, full._where_used_rows))
+
+    # Order index
+    assert appended._orders.equals(full._orders)
+    assert np.array_equal(appended._order_codes, full._order_codes)
+    assert np.array_equal(appended._order_indptr, full._order_indptr)
+    assert np.array_equal(appended._rows_by_order, full._rows_by_order)
+
+    # Level index: same offsets and the same rows in every level
+    assert np.array_equal(appended._level_indptr, full._level_indptr)
+    for level in range(-1, full.graph.n_levels):
+        assert np.array_equal(np.sort(appended._level_positions(level)), np.sort(full._level_positions(level)))
+
+    # Costs
+    lot_costs = pd.Series(appended._lot_costs, index=appended._lots).sort_index()
+    expected = pd.Series(full._lot_costs, index=full._lots).sort_index()
+    np.testing.assert_allclose(lot_costs.to_numpy(), expected.to_numpy(), equal_nan=True)
+    np.testing.assert_allclose(
+        appended.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        full.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        equal_nan=True
+    )
+    order_costs = appended.generate_manufacturing_costs()
+    expected = full.generate_manufacturing_costs()
+    assert order_costs['id_orden'].tolist() == expected['id_orden'].tolist()
+    np.testing.assert_allclose(order_costs['coste_unitario'], expected['coste_unitario'])
+
+
+def _append_in_parts(parts: list) -> tuple:
+    """
+    Costs the first part, appends the others one by one and costs all of them at once.
+
+    Returns
+    -------
+    tuple
+        (appended, full) calculators over the same rows in the same order.
+    """
+    appended = CostCalculator(parts[0], verbose=False)
+    appended.calculate_costs_recursively()
+    for part in parts[1:]:
+        appended.append(part)
+
+    full = CostCalculator(pd.concat(parts, ignore_index=True), verbose=False)
+    full.calculate_costs_recursively()
+    return appended, full
+
+
+@pytest.mark.parametrize('cuts', [['2024-07-01'], ['2024-03-01', '2024-06-01', '2024-10-01']])
+def test_append_by_date_matches_full_run(fabricaciones, cuts):
+    bounds = [pd.Timestamp.min, *pd.to_datetime(cuts), pd.Timestamp.max]
+    fechas = fabricaciones['fecha_fabricacion']
+    parts = [fabricaciones[(fechas >= start) & (fechas < end)] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    _assert_same_state(*_append_in_parts(parts))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_append_random_rows_matches_full_run(fabricaciones, seed):
+    # Random rows split orders and lots between the parts
+    parts = np.random.default_rng(seed).integers(0, 3, len(fabricaciones))
+    _assert_same_state(*_append_in_parts([fabricaciones[parts == part] for part in range(3)]))
+
+
+def _sem_lots(fabricaciones: pd.DataFrame) -> tuple:
+    """
+    Picks a SEM lot that rows with a never-manufactured lot fall back to, and the latest lot of its article.
+
+    Returns
+    -------
+    tuple
+        (articulo, fallback lot, latest lot by date).
+    """
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    substituted = calculator.fabricaciones['flag_lote_sustituido'].to_numpy(dtype=bool)
+    articulo, fallback = pd.Series(list(calculator._lots[calculator._component_lot_codes[substituted]])).mode()[0]
+
+    lots = fabricaciones[fabricaciones['articulo'] == articulo]
+    latest = lots.sort_values(['fecha_fabricacion', 'lote_articulo'])['lote_articulo'].iloc[-1]
+    assert latest != fallback
+    return articulo, fallback, latest
+
+
+@pytest.mark.parametrize('which', ['fallback', 'latest'])
+def test_append_new_lot_of_fallback_matched_sem_article(fabricaciones, which):
+    articulo, fallback, latest = _sem_lots(fabricaciones)
+    lote = fallback if which == 'fallback' else latest
+    held = ((fabricaciones['articulo'] == articulo) & (fabricaciones['lote_articulo'] == lote)).to_numpy()
+
+    appended = CostCalculator(fabricaciones[~held], verbose=False)
+    appended.calculate_costs_recursively()
+    before = _lot_labels(appended, appended._component_lot_codes)
+    appended.append(fabricaciones[held])
+
+    full = CostCalculator(pd.concat([fabricaciones[~held], fabricaciones[held]], ignore_index=True), verbose=False)
+    full.calculate_costs_recursively()
+
+    # Rows falling back to the held lot were matched to another lot before the append
+    after = _lot_labels(full, full._component_lot_codes)[:len(before)]
+    moved = [old != new for old, new in zip(before, after) if new is not None and new[0] == articulo]
+    assert any(moved) == (which == 'fallback')
+    _assert_same_state(appended, full)
+
+
+def test_append_closing_a_cycle_clears_its_lots(build_fabricaciones):
+    fabricaciones = build_fabricaciones([
+        ('O1', '2024-01-01', 'SEM1', 'L1', 'MAT1', 'M1', 1.0, 2.0),
+        ('O2', '2024-01-02', 'SEM2', 'L2', 'SEM1', 'L1', np.nan, 1.0),
+        ('O3', '2024-01-03', 'FCAR1', 'F1', 'SEM2', 'L2', np.nan, 1.0),
+        # SEM1 L1 consumes FCAR1 F1, which consumes it back
+        ('O4', '2024-01-04', 'SEM1', 'L1', 'FCAR1', 'F1', np.nan, 1.0),
+    ])
+    appended, full = _append_in_parts([fabricaciones[:3], fabricaciones[3:]])
+    _assert_same_state(appended, full)
+    assert np.isnan(appended._lot_costs).all()
+    assert appended.fabricaciones['coste_componente_unitario'].isna().tolist() == [False, True, True, True]
+
+
+def test_bom_graph_extend_matches_fresh_build():
+    rng = np.random.default_rng(0)
+    parents = np.concatenate([rng.integers(1, 30, 80), rng.integers(1, 40, 80)])
+    children = rng.integers(0, 40, 160) % parents
+    old, new = np.arange(160) < 80, np.arange(160) >= 80
+
+    # Remove a few old edges; an edge that the new rows add again stays
+    removed_parents, removed_children = parents[:5], children[:5]
+    graph = BomGraph(parents[old], children[old], 30)
+    graph.extend(40, parents[new], children[new], removed_parents, removed_children)
+
+    removed = set(zip(removed_parents, removed_children)) - set(zip(parents[new], children[new]))
+    kept = np.array([edge not in removed for edge in zip(parents, children)])
+    fresh = BomGraph(parents[kept], children[kept], 40)
+
+    assert np.array_equal(graph.levels, fresh.levels)
+    assert np.array_equal(graph.parents, fresh.parents)
+    assert np.array_equal(graph.children, fresh.children)
+    assert np.array_equal(graph._child_indptr, fresh._child_indptr)
+    assert np.array_equal(graph._parents_by_child, fresh._parents_by_child)
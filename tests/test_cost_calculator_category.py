@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+
+
+def test_category_split_adds_up_on_sample_data(fabricaciones):
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively()
+    desglose = calculator.calculate_cost_by_category()
+
+    categories = desglose.columns.drop(['articulo', 'lote_articulo', 'coste_total', 'coste_semielaborados'])
+    assert {'MATERIA PRIMA', 'MATERIAL AUXILIAR'} <= set(categories)
+
+    costed = ~np.isnan(calculator._lot_costs)
+    np.testing.assert_allclose(desglose['coste_total'][costed], calculator._lot_costs[costed])
+    np.testing.assert_allclose(desglose[categories].sum(axis=1)[costed], desglose['coste_total'][costed])
+
+
+def test_missing_category_column_is_explained(fabricaciones):
+    calculator = CostCalculator(fabricaciones.drop(columns='familia'), verbose=False)
+    calculator.calculate_costs_recursively()
+    with pytest.raises(ValueError, match="Falta la columna de categoría 'familia'.*Parameters.fabricaciones"):
+        calculator.calculate_cost_by_category()
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def _interrupt_at_level(level: int):
+    """
+    Progress callback that stops the rollup when the record of `level` is emitted.
+    """
+    def callback(record):
+        if record['etapa'] == 'nivel' and record['nivel'] == level:
+            raise _Interrupted
+    return callback
+
+
+def _assert_same_costs(calculator: CostCalculator, expected: CostCalculator) -> None:
+    np.testing.assert_allclose(calculator._lot_costs, expected._lot_costs, equal_nan=True)
+    np.testing.assert_allclose(
+        calculator.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        expected.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        equal_nan=True
+    )
+    np.testing.assert_allclose(
+        calculator.generate_manufacturing_costs()['coste_unitario'],
+        expected.generate_manufacturing_costs()['coste_unitario']
+    )
+
+
+def _with_price(fabricaciones, componente: str, lote: str, coste: float):
+    rows = (fabricaciones['componente'] == componente) & (fabricaciones['lote_componente'] == lote)
+    assert rows.any()
+    return fabricaciones.assign(coste_componente_unitario=fabricaciones['coste_componente_unitario'].mask(rows, coste))
+
+
+def test_interrupted_rollup_resumes_from_checkpoint(fabricaciones, tmp_path):
+    checkpoint = str(tmp_path / 'rollup.npz')
+    expected = CostCalculator(fabricaciones, verbose=False)
+    expected.calculate_costs_recursively()
+    assert expected.graph.n_levels > 2
+
+    # Level 1 is done and checkpointed; the record of level 2 stops the run before its checkpoint
+    interrupted = CostCalculator(fabricaciones, verbose=False, callbacks=[_interrupt_at_level(2)])
+    with pytest.raises(_Interrupted):
+        interrupted.calculate_costs_recursively(checkpoint_path=checkpoint)
+    assert (tmp_path / 'rollup.npz').exists()
+
+    resumed = CostCalculator(fabricaciones, verbose=False)
+    resumed.calculate_costs_recursively(checkpoint_path=checkpoint)
+    levels = resumed.get_events().query("etapa == 'nivel'")['nivel']
+    assert levels.tolist() == list(range(2, expected.graph.n_levels + 1))
+    _assert_same_costs(resumed, expected)
+    assert not (tmp_path / 'rollup.npz').exists()
+
+
+def test_checkpoint_of_other_inputs_is_ignored(fabricaciones, tmp_path):
+    checkpoint = str(tmp_path / 'rollup.npz')
+    interrupted = CostCalculator(fabricaciones, verbose=False, callbacks=[_interrupt_at_level(2)])
+    with pytest.raises(_Interrupted):
+        interrupted.calculate_costs_recursively(checkpoint_path=checkpoint)
+
+    changed = _with_price(fabricaciones, 'MAUX001', '2312-018', 9.5)
+    resumed = CostCalculator(changed, verbose=False)
+    resumed.calculate_costs_recursively(checkpoint_path=checkpoint)
+    assert resumed.get_events().query("etapa == 'nivel'")['nivel'].iat[0] == 1
+
+    expected = CostCalculator(changed, verbose=False)
+    expected.calculate_costs_recursively()
+    _assert_same_costs(resumed, expected)
+
+
+def test_cost_cache_is_reused_only_for_unchanged_inputs(fabricaciones, tmp_path):
+    cache = str(tmp_path / 'costes.pkl')
+    first = CostCalculator(fabricaciones, verbose=False)
+    first.calculate_costs_recursively(cache_path=cache)
+
+    # Same inputs: every costed lot comes from the cache and nothing is summed again
+    same = CostCalculator(fabricaciones, verbose=False)
+    same.calculate_costs_recursively(cache_path=cache)
+    assert same.get_events().query("etapa == 'nivel'")['lotes_calculados'].sum() == 0
+    _assert_same_costs(same, first)
+
+    # A changed price invalidates the lots consuming it and everything downstream of them, and only those
+    changed = _with_price(fabricaciones, 'MAUX001', '2312-018', 9.5)
+    calculator = CostCalculator(changed, verbose=False)
+    rows = ((changed['componente'] == 'MAUX001') & (changed['lote_componente'] == '2312-018')).to_numpy()
+    stale = np.zeros(len(calculator._lots), dtype=bool)
+    stale[calculator.graph.ancestors(np.unique(calculator._lot_codes[rows]))] = True
+
+    cached = calculator._load_cost_cache(cache, calculator._lot_input_hashes())
+    assert np.array_equal(np.isnan(cached), stale | np.isnan(first._lot_costs))
+    np.testing.assert_array_equal(cached[~stale], first._lot_costs[~stale])
+
+    calculator.calculate_costs_recursively(cache_path=cache)
+    expected = CostCalculator(changed, verbose=False)
+    expected.calculate_costs_recursively()
+    _assert_same_costs(calculator, expected)
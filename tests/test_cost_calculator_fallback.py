@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+
+
+def test_fallback_follows_lot_dates_not_labels(build_fabricaciones):
+    # DDMMYY labels: 311223 sorts after 150124 although it is older
+    fabricaciones = build_fabricaciones([
+        ('O1', '2023-12-31', 'SEM1', '311223', 'MAT1', 'A', 1.0, 1.0),
+        ('O2', '2024-01-15', 'SEM1', '150124', 'MAT1', 'A', 2.0, 1.0),
+        ('O3', '2024-01-10', 'PT1', 'P1', 'SEM1', '050124', np.nan, 1.0),
+        ('O4', '2024-02-01', 'PT1', 'P2', 'SEM1', '010224', np.nan, 1.0),
+        ('O5', '2023-12-01', 'PT1', 'P3', 'SEM1', '011223', np.nan, 1.0),
+        ('O6', '2024-02-01', 'PT1', 'P4', 'SEM1', '150124', np.nan, 1.0),
+    ])
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively()
+
+    used = [lot if lot is None else lot[1] for lot in
+            (calculator._lots[code] if code >= 0 else None for code in calculator._component_lot_codes)]
+    # Last lot made on or before the row, or the first lot when all are later
+    assert used[2:] == ['311223', '150124', '311223', '150124']
+    assert calculator.fabricaciones['flag_lote_sustituido'].tolist() == [False, False, True, True, True, False]
+    np.testing.assert_allclose(calculator.generate_manufacturing_costs()['coste_unitario'], [1, 1, 1, 2, 2, 2])
+
+
+def test_fallback_on_sample_data(fabricaciones):
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    rows = calculator.fabricaciones
+    substituted = rows['flag_lote_sustituido'].to_numpy(dtype=bool)
+    assert substituted.any()
+
+    made = rows.groupby(['articulo', 'lote_articulo'])['fecha_fabricacion'].min()
+    consumed = pd.MultiIndex.from_arrays([rows['componente'], rows['lote_componente']])
+    assert np.array_equal(substituted, ~consumed.isin(made.index) & rows['componente'].isin(rows['articulo']))
+
+    made = made.reset_index().sort_values(['fecha_fabricacion', 'lote_articulo'])
+    for position in np.flatnonzero(substituted):
+        lots = made[made['articulo'] == rows['componente'].iat[position]]
+        earlier = lots[lots['fecha_fabricacion'] <= rows['fecha_fabricacion'].iat[position]]
+        expected = (earlier if len(earlier) else lots.iloc[:1])['lote_articulo'].iat[-1]
+        assert calculator._lots[calculator._component_lot_codes[position]][1] == expected
+
+    # Consumed on 2024-01-02, before any lot of SEM122: the first one, not the last by label
+    position = np.flatnonzero((rows['componente'] == 'SEM122') & (rows['lote_componente'] == '191223'))[0]
+    assert calculator._lots[calculator._component_lot_codes[position]] == ('SEM122', '270124')
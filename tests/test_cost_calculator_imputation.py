@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+from calculadora_costes.services.price_index import PriceIndex
+
+
+def test_missing_prices_take_the_closest_earlier_lot(build_fabricaciones):
+    costes = pd.DataFrame([
+        ('MAT1', '2401-005', 2.0),
+        ('MAT1', '2312-001', 1.0),
+        ('MAT1', '2403-001', 5.0),
+        # MAT2 was only bought after the lot consumed below
+        ('MAT2', '2402-010', 3.0),
+    ], columns=['componente', 'lote_componente', 'coste_componente_unitario'])
+    fabricaciones = build_fabricaciones([
+        ('O1', '2024-03-01', 'PT1', 'P1', 'MAT1', '2402-003', np.nan, 1.0),
+        ('O1', '2024-03-01', 'PT1', 'P1', 'MAT1', '2401-005', 4.0, 1.0),
+        ('O2', '2024-03-01', 'PT2', 'P2', 'MAT1', '2401-005', np.nan, 2.0),
+        ('O2', '2024-03-01', 'PT2', 'P2', 'MAT1', '2311-001', np.nan, 1.0),
+        ('O2', '2024-03-01', 'PT2', 'P2', 'MAT2', '2401-001', np.nan, 1.0),
+        ('O2', '2024-03-01', 'PT2', 'P2', 'MAT9', '2401-001', np.nan, 1.0),
+        ('O3', '2024-03-01', 'SEM1', 'S1', 'MAT1', '2312-001', 1.0, 1.0),
+        ('O4', '2024-03-02', 'PT3', 'P3', 'SEM1', 'S1', np.nan, 3.0),
+    ])
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.impute_missing_prices(PriceIndex(costes, date_column='lote_componente'))
+    rows = calculator.fabricaciones
+
+    # Lot order, not file order: 2402-003 takes 2401-005, and an exact lot without price takes its own;
+    # a lot older than every purchase, an unknown component and a manufactured lot stay without price
+    np.testing.assert_allclose(rows['coste_componente_unitario'],
+                               [2.0, 4.0, 2.0, np.nan, np.nan, np.nan, 1.0, np.nan])
+    flags = [True, False, True, False, False, False, False, False]
+    assert rows['precio_imputado'].tolist() == flags
+
+    # Imputed prices reach the rollup, and a second imputation keeps the flags
+    calculator.calculate_costs_recursively()
+    calculator.impute_missing_prices(PriceIndex(costes, date_column='lote_componente'))
+    assert calculator.fabricaciones['precio_imputado'].tolist() == flags
+    costs = calculator.generate_manufacturing_costs().set_index('id_orden')['coste_unitario']
+    assert costs['O1'] == 6.0
+    assert costs['O4'] == 3.0
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+
+
+@pytest.fixture(scope='module')
+def full_costs(fabricaciones) -> pd.DataFrame:
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively()
+    return calculator.generate_manufacturing_costs().set_index('id_orden')
+
+
+@pytest.mark.parametrize('horizon', [None, 12, 2])
+def test_partitioned_costs_match_full_run_unless_provisional(fabricaciones, full_costs, horizon):
+    costes = CostCalculator.calculate_partitioned(
+        CostCalculator.split_by_period(fabricaciones), horizon=horizon, verbose=False
+    ).set_index('id_orden')
+
+    assert sorted(costes.index) == sorted(full_costs.index)
+    expected = full_costs['coste_unitario'].reindex(costes.index)
+    differs = ~np.isclose(costes['coste_unitario'], expected)
+    assert not (differs & ~costes['coste_provisional']).any()
+
+
+def test_partitioned_revisions_flag_earlier_orders(fabricaciones):
+    results = list(CostCalculator.iter_partitioned(CostCalculator.split_by_period(fabricaciones), verbose=False))
+    revised = np.concatenate([revisadas for _, revisadas in results])
+    assert len(revised)
+
+    # Revised orders belong to earlier partitions and are flagged by calculate_partitioned
+    seen = set()
+    for costes, revisadas in results:
+        assert set(revisadas) <= seen
+        seen |= set(costes['id_orden'])
+    costes = CostCalculator.calculate_partitioned(CostCalculator.split_by_period(fabricaciones), verbose=False)
+    assert costes.loc[costes['id_orden'].isin(revised), 'coste_provisional'].all()
+
+
+def test_partitioned_state_is_bounded_by_horizon(fabricaciones):
+    month = fabricaciones[fabricaciones['fecha_fabricacion'].dt.month == 3]
+
+    def months(n):
+        # Same orders every month, with new lot labels that sort after the previous ones
+        for i in range(n):
+            partition = month.assign(fecha_fabricacion=month['fecha_fabricacion'] + pd.DateOffset(months=i))
+            for column in ('lote_articulo', 'lote_componente'):
+                partition[column] = partition[column] + f'-{i:03d}'
+            yield partition
+
+    records = []
+    for _ in CostCalculator.iter_partitioned(months(12), horizon=3, verbose=False,
+                                             callbacks=[records.append]):
+        pass
+    partitions = pd.DataFrame([record for record in records if record['etapa'] == 'particion'])
+
+    assert len(partitions) == 12
+    steady = partitions.iloc[4:]
+    assert steady['aristas'].nunique() == 1
+    assert steady['lotes_conocidos'].nunique() == 1
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def test_cost_distribution_does_not_depend_on_batch_size(fabricaciones):
+    costes = pd.read_csv(os.path.join(ROOT, 'data', 'clean', 'costes_clean.csv'), dtype={'lote_componente': str})
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively()
+
+    distributions = [
+        calculator.simulate_cost_distribution(costes, n_samples=300, batch_size=batch_size, seed=1)
+        for batch_size in (300, 77)
+    ]
+    pd.testing.assert_frame_equal(*distributions)
+
+
+def test_constant_prices_give_the_deterministic_costs(fabricaciones):
+    # One price per purchased component, written into the rows as well
+    purchased = ~fabricaciones['componente'].str.startswith('SEM')
+    prices = fabricaciones[purchased].groupby('componente')['coste_componente_unitario'].first()
+    fabricaciones = fabricaciones.assign(coste_componente_unitario=np.where(
+        purchased, fabricaciones['componente'].map(prices), fabricaciones['coste_componente_unitario']
+    ))
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively()
+
+    precios = pd.concat([prices.reset_index()] * 3, ignore_index=True)
+    distribution = calculator.simulate_cost_distribution(precios, n_samples=50, seed=0)
+    expected = calculator.generate_manufacturing_costs().groupby('articulo')['coste_unitario'].mean()
+
+    for column in distribution.columns:
+        np.testing.assert_allclose(distribution[column], expected.reindex(distribution.index))
+
+
+def test_percentiles_are_ordered_around_the_mean(fabricaciones):
+    costes = pd.read_csv(os.path.join(ROOT, 'data', 'clean', 'costes_clean.csv'), dtype={'lote_componente': str})
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively()
+    distribution = calculator.simulate_cost_distribution(costes, n_samples=400, percentiles=(0, 5, 50, 95, 100),
+                                                         seed=0)
+
+    percentiles = distribution.drop(columns='media').to_numpy()
+    assert (np.diff(percentiles, axis=1) >= 0).all()
+    # Skewed prices (mostly 0, sometimes 9) can put the mean above p95, never outside the sampled range
+    tolerance = 1e-9 * distribution['media'].abs()
+    assert (distribution['p0'] - tolerance <= distribution['media']).all()
+    assert (distribution['media'] <= distribution['p100'] + tolerance).all()
+    # Prices do vary: some article spreads
+    assert (distribution['p95'] > distribution['p5']).any()
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+from synthetic_bom import generate_fabricaciones
+
+
+def _solve(fabricaciones, solver: str, **options) -> CostCalculator:
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively(solver=solver, **options)
+    return calculator
+
+
+def _assert_same_costs(levels: CostCalculator, sparse: CostCalculator) -> None:
+    """
+    Asserts that both solvers left the same row, lot and order costs and flags.
+    """
+    np.testing.assert_allclose(
+        levels.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        sparse.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        equal_nan=True
+    )
+    np.testing.assert_allclose(levels._lot_costs, sparse._lot_costs, equal_nan=True)
+    assert levels.fabricaciones['flag_coste_calculado'].equals(sparse.fabricaciones['flag_coste_calculado'])
+    np.testing.assert_allclose(
+        levels.generate_manufacturing_costs()['coste_unitario'],
+        sparse.generate_manufacturing_costs()['coste_unitario']
+    )
+
+
+def test_sparse_solver_matches_levels_on_sample_data(fabricaciones):
+    _assert_same_costs(_solve(fabricaciones, 'levels'), _solve(fabricaciones, 'sparse'))
+
+
+@pytest.mark.parametrize('depth', [2, 5])
+def test_sparse_solver_matches_levels_on_synthetic_bom(depth):
+    fabricaciones = generate_fabricaciones(20_000, depth=depth, seed=depth)
+    levels, sparse = _solve(fabricaciones, 'levels'), _solve(fabricaciones, 'sparse')
+    _assert_same_costs(levels, sparse)
+    assert levels.graph.n_levels == depth
+    assert not np.isnan(sparse._lot_costs).any()
+
+
+def test_blocked_lot_clears_prefilled_consumer_costs(build_fabricaciones):
+    # MAT1 has no price, so SEM1 is blocked; SEM2 holds a stale cost for SEM1
+    fabricaciones = build_fabricaciones([
+        ('O1', '2024-01-01', 'SEM1', 'L1', 'MAT1', 'M1', np.nan, 1.0),
+        ('O2', '2024-01-02', 'SEM2', 'L2', 'SEM1', 'L1', 5.0, 2.0),
+        ('O2', '2024-01-02', 'SEM2', 'L2', 'MAT2', 'M2', 3.0, 1.0),
+    ])
+    levels, sparse = _solve(fabricaciones, 'levels'), _solve(fabricaciones, 'sparse')
+    _assert_same_costs(levels, sparse)
+
+    assert np.isnan(levels.fabricaciones['coste_componente_unitario'].iat[1])
+    assert not levels.fabricaciones['flag_coste_calculado'].iat[1]
+    assert levels.generate_manufacturing_costs().set_index('id_orden').at['O2', 'coste_unitario'] == 3.0
+    assert set(levels.diagnose_dependencies()['articulo']) == {'SEM1', 'SEM2'}
+
+
+@pytest.mark.parametrize('max_iterations', [1, 2])
+def test_truncated_rollup_matches_sparse_solver(fabricaciones, max_iterations):
+    levels = _solve(fabricaciones, 'levels', max_iterations=max_iterations)
+    _assert_same_costs(levels, _solve(fabricaciones, 'sparse', max_iterations=max_iterations))
+    full = _solve(fabricaciones, 'levels')
+    missing = [c.fabricaciones['coste_componente_unitario'].isna().sum() for c in (levels, full)]
+    assert missing[0] > missing[1]
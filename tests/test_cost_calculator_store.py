@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+
+
+def _run(fabricaciones, store_path=None, **options) -> tuple:
+    """
+    Costs `fabricaciones` and tells whether the result came from the store.
+    """
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    calculator.calculate_costs_recursively(store_path=store_path, **options)
+    reused = calculator.get_events().query("etapa == 'calculo'")['reutilizado'].iat[-1]
+    return calculator, bool(reused)
+
+
+def _assert_same_costs(calculator: CostCalculator, expected: CostCalculator) -> None:
+    np.testing.assert_allclose(calculator._lot_costs, expected._lot_costs, equal_nan=True)
+    np.testing.assert_allclose(
+        calculator.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        expected.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        equal_nan=True
+    )
+    assert calculator.fabricaciones['flag_coste_calculado'].equals(expected.fabricaciones['flag_coste_calculado'])
+
+
+@pytest.fixture
+def stored(fabricaciones, tmp_path) -> tuple:
+    """
+    Store holding the result of the sample data, and that first calculator.
+    """
+    calculator, reused = _run(fabricaciones, str(tmp_path))
+    assert not reused
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+    return str(tmp_path), calculator
+
+
+def test_store_hit_returns_the_stored_result(fabricaciones, stored):
+    store_path, first = stored
+    calculator, reused = _run(fabricaciones, store_path)
+    assert reused
+    _assert_same_costs(calculator, first)
+    assert calculator.get_events().query("etapa == 'nivel'").empty
+
+
+def test_store_misses_after_an_input_change(fabricaciones, stored):
+    store_path, _ = stored
+    rows = (fabricaciones['componente'] == 'MAUX001') & (fabricaciones['lote_componente'] == '2312-018')
+    changed = fabricaciones.assign(coste_componente_unitario=fabricaciones['coste_componente_unitario'].mask(rows, 9.5))
+
+    calculator, reused = _run(changed, store_path)
+    assert not reused
+    _assert_same_costs(calculator, _run(changed)[0])
+
+    # Fewer levels are another result as well
+    assert not _run(fabricaciones, store_path, max_iterations=2)[1]
+
+
+def test_force_recalculates_a_stored_result(fabricaciones, stored):
+    store_path, first = stored
+    calculator, reused = _run(fabricaciones, store_path, force=True)
+    assert not reused
+    assert not calculator.get_events().query("etapa == 'nivel'").empty
+    _assert_same_costs(calculator, first)
+
+
+def test_changed_prefilled_sem_cost_is_not_stale(fabricaciones, stored):
+    # Rows consuming a manufactured lot are overwritten by every rollup, so their prefilled
+    # cost is left out of the fingerprint; the stored result must still be the right one
+    store_path, _ = stored
+    calculator = CostCalculator(fabricaciones, verbose=False)
+    consumes_lot = calculator._component_lot_codes >= 0
+    assert consumes_lot.any()
+    changed = fabricaciones.assign(coste_componente_unitario=np.where(
+        consumes_lot, 123.0, fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)
+    ))
+
+    calculator, reused = _run(changed, store_path)
+    assert reused
+    _assert_same_costs(calculator, _run(changed)[0])
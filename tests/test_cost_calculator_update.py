@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculadora_costes.services.cost_calculator import CostCalculator
+
+
+def _corrected(fabricaciones: pd.DataFrame, changes: pd.DataFrame) -> pd.DataFrame:
+    """
+    The fabrications with the corrected purchase prices written into them.
+    """
+    prices = changes.set_index(['componente', 'lote_componente'])['coste_componente_unitario']
+    keys = pd.MultiIndex.from_arrays([fabricaciones['componente'], fabricaciones['lote_componente']])
+    return fabricaciones.assign(coste_componente_unitario=np.where(
+        keys.isin(prices.index),
+        prices.reindex(keys).to_numpy(),
+        fabricaciones['coste_componente_unitario'].to_numpy(dtype=float)
+    ))
+
+
+@pytest.mark.parametrize('changes', [
+    # Shared by some 75 lots, semi-finished ones among them
+    [('MAUX001', '2312-018', 9.5)],
+    [('MAUX001', '2312-018', 9.5), ('VAR417', '2401-079', 0.25), ('MAUX002', '2406-031', np.nan)],
+])
+def test_update_component_costs_matches_full_run(fabricaciones, changes):
+    changes = pd.DataFrame(changes, columns=['componente', 'lote_componente', 'coste_componente_unitario'])
+
+    updated = CostCalculator(fabricaciones, verbose=False)
+    updated.calculate_costs_recursively()
+    before = updated.generate_manufacturing_costs().set_index('id_orden')['coste_unitario']
+    affected = updated.update_component_costs(changes)
+
+    full = CostCalculator(_corrected(fabricaciones, changes), verbose=False)
+    full.calculate_costs_recursively()
+
+    np.testing.assert_allclose(
+        updated.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        full.fabricaciones['coste_componente_unitario'].to_numpy(dtype=float),
+        equal_nan=True
+    )
+    np.testing.assert_allclose(updated._lot_costs, full._lot_costs, equal_nan=True)
+    assert updated.fabricaciones['flag_coste_calculado'].equals(full.fabricaciones['flag_coste_calculado'])
+
+    expected = full.generate_manufacturing_costs().set_index('id_orden')['coste_unitario']
+    np.testing.assert_allclose(updated.generate_manufacturing_costs()['coste_unitario'], expected.to_numpy())
+
+    # The returned orders are exactly those whose cost changed, with their new cost
+    moved = ~np.isclose(before, expected.reindex(before.index))
+    assert set(before.index[moved]) <= set(affected['id_orden'])
+    np.testing.assert_allclose(affected['coste_unitario'], expected.reindex(affected['id_orden']).to_numpy())
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculadora_costes.services.inventory_costing import InventoryCosting
+
+
+@pytest.fixture(scope='module')
+def costing() -> InventoryCosting:
+    compras = pd.DataFrame([
+        # Received before the first consumption of MAT1 and followed by another purchase: already consumed
+        ('MAT1', '2023-06-01', 1000.0, 9.0),
+        ('MAT1', '2024-01-01', 100.0, 1.0),
+        ('MAT1', '2024-01-10', 100.0, 2.0),
+        ('MAT1', '2024-01-20', 50.0, 4.0),
+        ('MAT1', '2024-01-22', 0.0, 99.0),
+        ('MAT2', '2024-02-01', 100.0, 5.0),
+    ], columns=['componente', 'fecha_precio', 'unidades_compradas', 'coste_componente_unitario'])
+    compras['fecha_precio'] = pd.to_datetime(compras['fecha_precio'])
+    return InventoryCosting(compras)
+
+
+# Consumptions in input order. The last two of MAT1 are later than every purchase and given in
+# reverse date order; MAT2 on 2023-01-01 is earlier than every purchase.
+CONSUMOS = pd.DataFrame([
+    ('MAT1', '2024-01-05', 60.0),
+    ('MAT1', '2024-01-12', 80.0),
+    ('MAT2', '2023-01-01', 10.0),
+    ('MAT1', '2024-02-10', 30.0),
+    ('MAT1', '2024-02-03', 70.0),
+    ('MAT2', '2024-02-05', 20.0),
+    ('MAT3', '2024-02-05', 5.0),
+], columns=['componente', 'fecha', 'cantidad'])
+
+
+def _cost(costing: InventoryCosting, method: str) -> np.ndarray:
+    return getattr(costing, method)(CONSUMOS['componente'], pd.to_datetime(CONSUMOS['fecha']), CONSUMOS['cantidad'])
+
+
+def test_fifo_matches_ledger(costing):
+    # MAT1 layers: 100 @ 1, 100 @ 2, 50 @ 4
+    #   2024-01-05:  60 @ 1                  -> 1.0
+    #   2024-01-12:  40 @ 1 + 40 @ 2         -> 1.5
+    #   2024-02-03:  60 @ 2 + 10 @ 4 = 160   -> 160 / 70
+    #   2024-02-10:  30 @ 4                  -> 4.0
+    # MAT2: nothing received by 2023-01-01; its 10 units are covered by the 2024-02-01 purchase
+    expected = [1.0, 1.5, np.nan, 4.0, 160 / 70, 5.0, np.nan]
+    np.testing.assert_allclose(_cost(costing, 'fifo'), expected, equal_nan=True)
+
+
+def test_moving_average_matches_ledger(costing):
+    # MAT1 average after each purchase, with the stock on hand before it:
+    #   2024-01-01: stock 0                                  -> 1
+    #   2024-01-10: stock 100 - 60 = 40, (40 * 1 + 100 * 2) / 140  -> 240 / 140
+    #   2024-01-20: stock 200 - 140 = 60, (60 * 240 / 140 + 50 * 4) / 110
+    after_second = 240 / 140
+    after_third = (60 * after_second + 50 * 4) / 110
+    expected = [1.0, after_second, np.nan, after_third, after_third, 5.0, np.nan]
+    np.testing.assert_allclose(_cost(costing, 'moving_average'), expected, equal_nan=True)
+
+
+def test_consumption_order_does_not_change_costs(costing):
+    shuffled = CONSUMOS.sample(frac=1.0, random_state=0)
+    for method in ('fifo', 'moving_average'):
+        costs = getattr(costing, method)(shuffled['componente'], pd.to_datetime(shuffled['fecha']),
+                                         shuffled['cantidad'])
+        np.testing.assert_allclose(costs, _cost(costing, method)[shuffled.index], equal_nan=True)